@@ -3,36 +3,71 @@ from logging.handlers import SMTPHandler, RotatingFileHandler
 
 from flask import Flask
 from .config import Config
-from flask_sqlalchemy import SQLAlchemy
+from .routing import RoutingSQLAlchemy
 from flask_migrate import Migrate
 from flask_login import LoginManager
 from flask_bootstrap import Bootstrap
 from flask_mail import Mail
 
-app = Flask(__name__)
-app.config.from_object(Config)
-db = SQLAlchemy(app)
-login = LoginManager(app)
-login.login_view = 'login'
-migrate = Migrate(app, db)
-bootstrap = Bootstrap(app)
-mail = Mail(app)
-
-
-if not app.debug:
-    if app.config['MAIL_SERVER']:
-        auth = None
-        if app.config['MAIL_USERNAME'] or app.config['MAIL_PASSWORD']:
-            auth = (app.config['MAIL_USERNAME'], app.config['MAIL_PASSWORD'])
-        secure = None
-        if app.config['MAIL_USE_TLS']:
-            secure = ()
-        mail_handler = SMTPHandler(
-            mailhost=(app.config['MAIL_SERVER'], app.config['MAIL_PORT']),
-            fromaddr='no-reply@' + app.config['MAIL_SERVER'],
-            toaddrs=app.config['ADMINS'], subject='BookStore Failure',
-            credentials=auth, secure=secure)
-        mail_handler.setLevel(logging.ERROR)
-        app.logger.addHandler(mail_handler)
-
-from app import routes, models, errors
+db = RoutingSQLAlchemy()
+login = LoginManager()
+login.login_view = 'main.login'
+migrate = Migrate()
+bootstrap = Bootstrap()
+mail = Mail()
+
+
+def create_app(config_class=Config):
+    """
+    build and configure the application.
+
+    Nothing here opens a database connection or starts a thread, so gunicorn can call it
+    once in the master (preload_app) and fork workers from the result.
+    """
+    app = Flask(__name__)
+    app.config.from_object(config_class)
+
+    db.init_app(app)
+    login.init_app(app)
+    migrate.init_app(app, db)
+    bootstrap.init_app(app)
+    mail.init_app(app)
+
+    from app import cache, fragments, instrumentation, metrics
+    cache.init_app(app)
+    fragments.init_app(app)
+    instrumentation.init_app(app)
+    metrics.init_app(app)
+
+    from app.outbox import outbox
+    outbox.init_app(app)
+
+    from app.routes import bp as main_bp
+    app.register_blueprint(main_bp)
+
+    from app.errors import bp as errors_bp
+    app.register_blueprint(errors_bp)
+
+    from app.cli import bp as cli_bp
+    app.register_blueprint(cli_bp)
+
+    if not app.debug:
+        if app.config['MAIL_SERVER']:
+            auth = None
+            if app.config['MAIL_USERNAME'] or app.config['MAIL_PASSWORD']:
+                auth = (app.config['MAIL_USERNAME'], app.config['MAIL_PASSWORD'])
+            secure = None
+            if app.config['MAIL_USE_TLS']:
+                secure = ()
+            mail_handler = SMTPHandler(
+                mailhost=(app.config['MAIL_SERVER'], app.config['MAIL_PORT']),
+                fromaddr='no-reply@' + app.config['MAIL_SERVER'],
+                toaddrs=app.config['ADMINS'], subject='BookStore Failure',
+                credentials=auth, secure=secure)
+            mail_handler.setLevel(logging.ERROR)
+            app.logger.addHandler(mail_handler)
+
+    return app
+
+
+from app import models
@@ -1,6 +1,8 @@
-from app import app, db
+from app import create_app, db
 from app.models import User, Book, Customer, Author
 
+app = create_app()
+
 
 @app.shell_context_processor
 def make_shell_context():
@@ -0,0 +1,95 @@
+import threading
+from collections import OrderedDict, namedtuple
+from time import monotonic
+
+BookTypeRef = namedtuple('BookTypeRef', 'id name rent_charge custom_pricing')
+AuthorRef = namedtuple('AuthorRef', 'id first_name last_name email')
+
+
+class TTLCache(object):
+    """
+    a process-local LRU cache whose entries also expire after `ttl` seconds.
+
+    Each gunicorn worker holds its own copy, so hits/misses are per process.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, load):
+        now = monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > now:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        value = load(key)
+        if value is not None:
+            with self._lock:
+                self._data[key] = (now + self.ttl, value)
+                self._data.move_to_end(key)
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+        return value
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._data), 'maxsize': self.maxsize}
+
+
+book_types = TTLCache(1024, 300)
+authors = TTLCache(1024, 300)
+users = TTLCache(1024, 60)
+# rendered template fragments, see app/fragments.py; keys carry each row's updated_at, so the TTL only ages out memory
+fragments = TTLCache(10000, 3600)
+
+
+def init_app(app):
+    for cache, prefix in ((book_types, 'REFERENCE'), (authors, 'REFERENCE'), (users, 'USER'),
+                          (fragments, 'FRAGMENT')):
+        cache.maxsize = app.config[f'{prefix}_CACHE_SIZE']
+        cache.ttl = app.config[f'{prefix}_CACHE_TTL']
+
+
+def load_book_type(id):
+    from app.models import BookType
+
+    bt = BookType.query.get(id)
+    if bt is None:
+        return None
+    return BookTypeRef(bt.id, bt.name, bt.rent_charge, bt.custom_pricing)
+
+
+def load_author(id):
+    from app.models import Author
+
+    author = Author.query.get(id)
+    if author is None:
+        return None
+    return AuthorRef(author.id, author.first_name, author.last_name, author.email)
+
+
+def get_book_type(id):
+    return book_types.get(id, load_book_type)
+
+
+def get_author(id):
+    return authors.get(id, load_author)
+
+
+def stats():
+    return {'book_types': book_types.stats(), 'authors': authors.stats(), 'users': users.stats(),
+            'fragments': fragments.stats()}
@@ -0,0 +1,196 @@
+import csv
+import io
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from flask import current_app
+from sqlalchemy.exc import SQLAlchemyError
+
+from app import db
+from app.models import Author, Book, BookType
+
+CATALOG_FIELDS = ['title', 'book_type', 'rent_charge', 'author_first_name', 'author_last_name', 'author_email']
+# row errors listed per batch; the rest are only counted
+MAX_BATCH_ERRORS = 20
+# emails per IN (...) lookup, under SQLite's bound parameter limit
+LOOKUP_SIZE = 500
+# BookType.name; longer names are rejected rather than truncated, since types are matched on name
+MAX_TYPE_NAME = 30
+
+
+def copy_rows(connection, table, columns, rows):
+    """
+    COPY rows into table over the session's own psycopg2 connection, inside its transaction
+    """
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows([row[c] for c in columns] for row in rows)
+    buffer.seek(0)
+    cursor = connection.connection.cursor()
+    try:
+        cursor.copy_expert(f'COPY {table.name} ({", ".join(columns)}) FROM STDIN WITH (FORMAT csv)', buffer)
+    finally:
+        cursor.close()
+
+
+def insert_rows(table, columns, rows):
+    if not rows:
+        return
+    connection = db.session.connection()
+    if connection.dialect.name == 'postgresql':
+        copy_rows(connection, table, columns, rows)
+    else:
+        connection.execute(table.insert(), rows)
+
+
+def parse(row, known_types):
+    """
+    a CSV row -> (book type name, rent charge or None, author, title); raises ValueError.
+
+    A book type that is not in known_types needs a rent_charge to be created with.
+    """
+    title = (row.get('title') or '').strip()
+    type_name = (row.get('book_type') or '').strip()
+    email = (row.get('author_email') or '').strip()
+    if not title:
+        raise ValueError('title is required')
+    if not type_name:
+        raise ValueError('book_type is required')
+    if len(type_name) > MAX_TYPE_NAME:
+        raise ValueError(f'book_type is longer than {MAX_TYPE_NAME} characters')
+    if not email or '@' not in email:
+        raise ValueError('author_email is required')
+    charge = (row.get('rent_charge') or '').strip()
+    if charge:
+        try:
+            charge = Decimal(charge)
+        except InvalidOperation:
+            raise ValueError(f'rent_charge {charge!r} is not a number')
+    elif type_name not in known_types:
+        raise ValueError(f'unknown book type {type_name!r} needs a rent_charge')
+    author = {
+        'first_name': (row.get('author_first_name') or '').strip()[:64],
+        'last_name': (row.get('author_last_name') or '').strip()[:64],
+        'email': email[:120],
+    }
+    return type_name, charge or None, author, title[:300]
+
+
+class CatalogImport(object):
+    """
+    streams a catalog CSV (see CATALOG_FIELDS) into books, authors and book types.
+
+    Rows are read batch_size at a time; each batch resolves its book types and authors
+    (deduplicated on author.email, existing authors win) with one lookup, inserts the new
+    ones and the books with COPY on PostgreSQL or an executemany elsewhere, and commits.
+    Bad rows are skipped and a batch that fails in the database is rolled back on its own,
+    both reported in `batches`.
+    """
+
+    def __init__(self, batch_size=None):
+        self.batch_size = batch_size or current_app.config['IMPORT_BATCH_SIZE']
+        self.book_types = {name: id for id, name in db.session.query(BookType.id, BookType.name)}
+        self.authors = {}
+        self.totals = {'rows': 0, 'books': 0, 'authors': 0, 'book_types': 0, 'errors': 0}
+        self.batches = []
+
+    def run(self, lines, progress=None):
+        """
+        import an iterable of CSV text lines; progress(batch) is called after every batch
+        """
+        reader = csv.DictReader(lines)
+        missing = [f for f in ('title', 'book_type', 'author_email') if f not in (reader.fieldnames or [])]
+        if missing:
+            raise ValueError(f'the CSV header is missing {", ".join(missing)}')
+        rows = ((reader.line_num, row) for row in reader)
+        while True:
+            chunk = list(islice(rows, self.batch_size))
+            if not chunk:
+                break
+            batch = self.load(len(self.batches) + 1, chunk)
+            self.batches.append(batch)
+            if progress is not None:
+                progress(batch)
+        return self.report()
+
+    def report(self):
+        return dict(self.totals, batches=self.batches)
+
+    def load(self, number, chunk):
+        batch = {'batch': number, 'first_line': chunk[0][0], 'last_line': chunk[-1][0],
+                 'books': 0, 'authors': 0, 'book_types': 0, 'errors': []}
+        errors = 0
+        parsed = []
+        known_types = set(self.book_types)
+        for line, row in chunk:
+            try:
+                parsed.append(parse(row, known_types))
+                known_types.add(parsed[-1][0])
+            except ValueError as e:
+                errors += 1
+                if len(batch['errors']) < MAX_BATCH_ERRORS:
+                    batch['errors'].append({'line': line, 'error': str(e)})
+
+        try:
+            book_types = self.add_book_types(parsed)
+            authors, inserted = self.add_authors(parsed)
+            now = datetime.utcnow()
+            books = [{
+                'created_at': now,
+                'timestamp': now,
+                'title': title,
+                'book_type': book_types.get(type_name) or self.book_types[type_name],
+                'author': authors.get(author['email']) or self.authors[author['email']],
+            } for type_name, _, author, title in parsed]
+            insert_rows(Book.__table__, ['created_at', 'timestamp', 'title', 'book_type', 'author'], books)
+            db.session.commit()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            errors += len(parsed)
+            batch['errors'].append({'line': None, 'error': f'batch rolled back: {getattr(e, "orig", e)}'[:300]})
+        else:
+            self.book_types.update(book_types)
+            self.authors.update(authors)
+            batch.update(books=len(books), authors=inserted, book_types=len(book_types))
+
+        batch['error_count'] = errors
+        for key in ('books', 'authors', 'book_types'):
+            self.totals[key] += batch[key]
+        self.totals['rows'] += len(chunk)
+        self.totals['errors'] += errors
+        return batch
+
+    def add_book_types(self, parsed):
+        """
+        create the book types this batch names for the first time; returns {name: id}
+        """
+        new = {}
+        for type_name, charge, _, _ in parsed:
+            if type_name not in self.book_types and type_name not in new:
+                new[type_name] = BookType(name=type_name, rent_charge=charge)
+        db.session.add_all(new.values())
+        db.session.flush()
+        return {name: book_type.id for name, book_type in new.items()}
+
+    def add_authors(self, parsed):
+        """
+        look up the batch's unseen author emails and insert the ones that do not exist yet;
+        returns ({email: id} for those emails, number inserted)
+        """
+        new = {}
+        for _, _, author, _ in parsed:
+            if author['email'] not in self.authors:
+                new.setdefault(author['email'], author)
+        found = author_ids(list(new))
+        now = datetime.utcnow()
+        inserted = [dict(author, created_at=now) for email, author in new.items() if email not in found]
+        insert_rows(Author.__table__, ['created_at', 'first_name', 'last_name', 'email'], inserted)
+        found.update(author_ids([author['email'] for author in inserted]))
+        return found, len(inserted)
+
+
+def author_ids(emails):
+    found = {}
+    for i in range(0, len(emails), LOOKUP_SIZE):
+        found.update(db.session.query(Author.email, Author.id).filter(Author.email.in_(emails[i:i + LOOKUP_SIZE])))
+    return found
@@ -0,0 +1,92 @@
+import time
+
+import click
+from flask import Blueprint
+
+from app.catalog import CatalogImport, CATALOG_FIELDS
+from app.exports import parse_day
+from app.outbox import outbox
+from app.overdue import sweep
+from app.reports import rebuild
+from app.seed import seed
+from app.statements import statement_archive, month_range, count_customers
+
+bp = Blueprint('cli', __name__, cli_group=None)
+
+
+@bp.cli.command('statements')
+@click.argument('month')
+@click.option('--output', '-o', type=click.Path(dir_okay=False, writable=True),
+              help='ZIP file to write, defaults to statements-MONTH.zip')
+def statements(month, output):
+    """Write every customer's statement for MONTH (YYYY-MM) to a ZIP archive."""
+    output = output or f'statements-{month}.zip'
+    total = count_customers(*month_range(month))
+    with open(output, 'wb') as f, click.progressbar(length=total, label=f'Statements for {month}') as bar:
+        for chunk in statement_archive(month, progress=lambda name: bar.update(1)):
+            f.write(chunk)
+    click.echo(f'Wrote {total} statements to {output}')
+
+
+@bp.cli.command('send-outbox')
+def send_outbox():
+    """Send every email in the outbox that is due, then exit."""
+    attempted = outbox.drain()
+    click.echo(f'Attempted {attempted} emails, {outbox.depth()} still pending')
+
+
+@bp.cli.command('seed')
+@click.option('--scale', '-n', default=100, show_default=True, help='number of customers to create')
+@click.option('--rentals-per-customer', default=5, show_default=True)
+@click.option('--seed', 'random_seed', default=0, show_default=True, help='random seed, for repeatable data')
+def seed_command(scale, rentals_per_customer, random_seed):
+    """Fill the database with generated customers, authors, books and rentals."""
+    counts = seed(scale, rentals_per_customer=rentals_per_customer, random_seed=random_seed)
+    click.echo(', '.join(f'{n} {name}' for name, n in counts.items()))
+
+
+@bp.cli.command('rebuild-rollups')
+@click.option('--from', 'start', help='first day to rebuild, YYYY-MM-DD; defaults to the first rental')
+@click.option('--to', 'end', help='last day to rebuild, YYYY-MM-DD; defaults to the last rental')
+def rebuild_rollups(start, end):
+    """Recompute the report rollups from the rentals, for backfills."""
+    try:
+        start, end = parse_day(start), parse_day(end)
+    except ValueError:
+        raise click.BadParameter('dates must be YYYY-MM-DD')
+    click.echo(f'Rolled up {rebuild(start, end)} rentals')
+
+
+@bp.cli.command('sweep-overdue')
+@click.option('--batch-size', type=int, help='rentals per transaction, defaults to OVERDUE_BATCH_SIZE')
+def sweep_overdue(batch_size):
+    """Flag rentals past their due date and price their late fees as of now."""
+    swept, flagged, charged = sweep(batch_size=batch_size)
+    click.echo(f'Swept {swept} overdue rentals, {flagged} newly flagged, late fees up by ${charged}')
+
+
+@bp.cli.command('import-catalog')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', type=int, help='rows per transaction, defaults to IMPORT_BATCH_SIZE')
+def import_catalog(path, batch_size):
+    """Import books, authors and book types from a CSV file.
+
+    The header names the columns: title, book_type, author_email and optionally
+    rent_charge (needed for new book types), author_first_name and author_last_name.
+    """
+    def progress(batch):
+        click.echo(f'batch {batch["batch"]} (lines {batch["first_line"]}-{batch["last_line"]}): '
+                   f'{batch["books"]} books, {batch["authors"]} new authors, {batch["error_count"]} errors')
+        for error in batch['errors']:
+            click.echo(f'  line {error["line"] or "-"}: {error["error"]}', err=True)
+
+    started = time.perf_counter()
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        try:
+            report = CatalogImport(batch_size).run(f, progress)
+        except ValueError as e:
+            raise click.ClickException(f'{e}; expected columns {", ".join(CATALOG_FIELDS)}')
+    seconds = time.perf_counter() - started
+    click.echo(f'Imported {report["books"]} books, {report["authors"]} authors and {report["book_types"]} book types '
+               f'from {report["rows"]} rows in {seconds:.1f}s ({report["rows"] / max(seconds, 1e-9):.0f} rows/s), '
+               f'{report["errors"]} errors')
@@ -0,0 +1,97 @@
+import hashlib
+import os
+from datetime import datetime
+from functools import wraps
+
+from flask import make_response, request, session
+from flask_login import current_user
+from sqlalchemy import func, select
+from werkzeug.http import is_resource_modified
+
+from app import db
+from app.pagination import page_keys
+
+_release = None
+
+
+def release():
+    """
+    a digest of the app's code and templates, so a deploy changes every ETag
+    """
+    global _release
+    if _release is None:
+        digest = hashlib.sha1()
+        root = os.path.dirname(os.path.abspath(__file__))
+        for directory, dirs, files in sorted(os.walk(root)):
+            dirs.sort()
+            for name in sorted(files):
+                if name.endswith(('.py', '.html')):
+                    with open(os.path.join(directory, name), 'rb') as f:
+                        digest.update(f.read())
+        _release = digest.hexdigest()
+    return _release
+
+
+def table_state(model, *criteria):
+    """
+    the row count and newest change of `model` (optionally of the rows matching `criteria`),
+    as scalar subqueries so several tables are checked in a single SELECT
+    """
+    return [
+        select(func.count()).select_from(model).where(*criteria).scalar_subquery(),
+        select(func.max(func.coalesce(model.updated_at, model.created_at))).where(*criteria).scalar_subquery(),
+    ]
+
+
+def page_state(key, *criteria):
+    """
+    table_state() of the rows on the requested keyset page (see pagination.page_keys), plus the
+    sum of their keys, so a row leaving or entering the page changes the state even when the
+    count and newest change do not
+    """
+    on_page = key.in_(page_keys(key))
+    return table_state(key.class_, on_page, *criteria) \
+        + [select(func.sum(key)).where(on_page, *criteria).scalar_subquery()]
+
+
+def conditional(*sources):
+    """
+    answer GET requests with 304 Not Modified when nothing the page shows has changed.
+
+    `sources` are models, meaning the whole table (keep those to small reference tables), or
+    functions taking the view's arguments and returning table_state()/page_state() columns.
+    Their values make the ETag and their newest timestamp Last-Modified, checked before the
+    view runs, so a 304 renders nothing.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # flashed messages are shown once, so a page carrying them is never "not modified"
+            if request.method not in ('GET', 'HEAD') or session.get('_flashes'):
+                return view(*args, **kwargs)
+            columns = []
+            for source in sources:
+                columns += table_state(source) if isinstance(source, type) else source(*args, **kwargs)
+            state = db.session.execute(select(*columns)).one()
+            timestamps = [value for value in state if isinstance(value, datetime)]
+            last_modified = max(timestamps).replace(microsecond=0) if timestamps else None
+            etag = hashlib.sha1(repr((release(), request.full_path, current_user.get_id(), tuple(state)))
+                                .encode('utf-8')).hexdigest()
+
+            if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            response.last_modified = last_modified
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            response.vary.add('Cookie')
+            return response
+
+        return wrapper
+
+    return decorator
@@ -1,4 +1,29 @@
 import os
+import tempfile
+
+
+def engine_options(uri):
+    """
+    pool and timeout settings for server databases; sqlite keeps the Flask-SQLAlchemy defaults
+    """
+    if uri.startswith('sqlite'):
+        return {}
+    options = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE') or 5),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW') or 10),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT') or 30),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE') or 1800),
+        'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', '1') not in ('0', 'false', 'False'),
+    }
+    statement_timeout = os.environ.get('DB_STATEMENT_TIMEOUT')
+    if statement_timeout and uri.startswith('postgresql'):
+        options['connect_args'] = {'options': f'-c statement_timeout={int(statement_timeout)}'}
+    return options
+
+
+def database_uri(name):
+    uri = os.environ.get(name)
+    return uri.replace("postgres://", "postgresql://", 1) if uri else None
 
 
 class Config(object):
@@ -9,7 +34,11 @@ class Config(object):
     DB_NAME = os.environ.get('DB_NAME')
     DB_HOST = os.environ.get('DB_HOST')
     # SQLALCHEMY_DATABASE_URI = f'{DB_ENGINE}://{DB_USER}:{DB_PASSWORD}@{DB_HOST}/{DB_NAME}'
-    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL').replace("://", "ql://", 1)
+    SQLALCHEMY_DATABASE_URI = database_uri('DATABASE_URL')
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+    # read-only views use the replica when REPLICA_DATABASE_URL is set, see app/routing.py
+    SQLALCHEMY_BINDS = {'replica': database_uri('REPLICA_DATABASE_URL')} \
+        if os.environ.get('REPLICA_DATABASE_URL') else {}
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     MAIL_SERVER = os.environ.get('MAIL_SERVER')
     MAIL_PORT = int(os.environ.get('MAIL_PORT') or 25)
@@ -17,4 +46,30 @@ class Config(object):
     MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
     ADMINS = ['njugunanduati@gmail.com']
+    MAIL_SENDER_THREADS = int(os.environ.get('MAIL_SENDER_THREADS') or 2)
+    MAIL_BATCH_SIZE = int(os.environ.get('MAIL_BATCH_SIZE') or 50)
+    MAIL_POLL_INTERVAL = float(os.environ.get('MAIL_POLL_INTERVAL') or 30)
+    MAIL_LEASE = int(os.environ.get('MAIL_LEASE') or 300)
+    MAIL_MAX_ATTEMPTS = int(os.environ.get('MAIL_MAX_ATTEMPTS') or 5)
+    MAIL_RETRY_BACKOFF = int(os.environ.get('MAIL_RETRY_BACKOFF') or 30)
+    SQL_SLOW_QUERY_MS = float(os.environ.get('SQL_SLOW_QUERY_MS') or 100)
+    PER_PAGE = int(os.environ.get('PER_PAGE') or 50)
+    MAX_PER_PAGE = int(os.environ.get('MAX_PER_PAGE') or 500)
+    SEARCH_LIMIT = int(os.environ.get('SEARCH_LIMIT') or 20)
+    QUOTE_MAX_CELLS = int(os.environ.get('QUOTE_MAX_CELLS') or 100000)
+    REFERENCE_CACHE_SIZE = int(os.environ.get('REFERENCE_CACHE_SIZE') or 1024)
+    REFERENCE_CACHE_TTL = int(os.environ.get('REFERENCE_CACHE_TTL') or 300)
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE') or 1024)
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL') or 60)
+    FRAGMENT_CACHE_SIZE = int(os.environ.get('FRAGMENT_CACHE_SIZE') or 10000)
+    FRAGMENT_CACHE_TTL = int(os.environ.get('FRAGMENT_CACHE_TTL') or 3600)
+    PDF_CACHE_DIR = os.environ.get('PDF_CACHE_DIR') or os.path.join(tempfile.gettempdir(), 'bookstore-pdf')
+    PDF_WORKERS = int(os.environ.get('PDF_WORKERS') or 2)
+    PDF_RENDER_TIMEOUT = float(os.environ.get('PDF_RENDER_TIMEOUT') or 10)
+    STATEMENT_BATCH_SIZE = int(os.environ.get('STATEMENT_BATCH_SIZE') or 500)
+    EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE') or 1000)
+    IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE') or 5000)
+    OVERDUE_BATCH_SIZE = int(os.environ.get('OVERDUE_BATCH_SIZE') or 1000)
+    PRICING_TTL = int(os.environ.get('PRICING_TTL') or 300)
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
     LOG_TO_STDOUT = os.environ.get('LOG_TO_STDOUT')
@@ -1,27 +1,17 @@
-from threading import Thread
-from flask import render_template
-from flask_mail import Message
-from app import app, mail
-
-
-def send_async_email(app, msg):
-    with app.app_context():
-        mail.send(msg)
+from flask import current_app, render_template
+from app.outbox import outbox
 
 
 def send_email(subject, sender, recipients, text_body, html_body):
-    msg = Message(subject, sender=sender, recipients=recipients)
-    msg.body = text_body
-    msg.html = html_body
-    Thread(target=send_async_email, args=(app, msg)).start()
+    outbox.enqueue(subject, sender, recipients, text_body, html_body)
 
 
 def send_password_reset_email(user):
     token = user.get_reset_password_token()
     send_email('[BookStore] Reset Your Password',
-               sender=app.config['ADMINS'][0],
+               sender=current_app.config['ADMINS'][0],
                recipients=[user.email],
-               text_body=render_template('email/reset_password.txt',
+               text_body=render_template('emails/reset_password.txt',
                                          user=user, token=token),
-               html_body=render_template('email/reset_password.html',
+               html_body=render_template('emails/reset_password.html',
                                          user=user, token=token))
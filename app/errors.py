@@ -1,13 +1,24 @@
-from flask import render_template
-from app import app, db
+from flask import Blueprint, render_template, request, jsonify
+from app import db
+from app.pricing import UnknownBookType
 
+bp = Blueprint('errors', __name__)
 
-@app.errorhandler(404)
+
+@bp.app_errorhandler(404)
 def not_found_error(error):
     return render_template('404.html'), 404
 
 
-@app.errorhandler(500)
+@bp.app_errorhandler(500)
 def internal_error(error):
     db.session.rollback()
     return render_template('500.html'), 500
+
+
+@bp.app_errorhandler(UnknownBookType)
+def unknown_book_type_error(error):
+    db.session.rollback()
+    if request.path.startswith('/api/'):
+        return jsonify(error=str(error)), 400
+    return render_template('404.html'), 404
@@ -0,0 +1,85 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from app import db
+from app.models import Author, Book, BookType, Customer, Rental
+from app.pricing import pricing
+
+LEDGER_FIELDS = ['id', 'rented_at', 'customer_id', 'customer', 'book_id', 'title', 'book_type', 'author',
+                 'duration', 'unit_price', 'total_cost']
+
+
+def parse_day(value):
+    return datetime.strptime(value, '%Y-%m-%d') if value else None
+
+
+def ledger_rows(start=None, end=None):
+    """
+    yield the rentals ledger as flat dicts, streamed from the database in batches.
+
+    `start` and `end` are inclusive days.
+    """
+    query = db.session.query(
+        Rental.id, Rental.created_at, Rental.customer_id, Customer.first_name, Customer.last_name,
+        Rental.book_id, Book.title, Book.book_type, BookType.name, Author.first_name, Author.last_name,
+        Rental.duration, Rental.unit_price, Rental.total_cost,
+    ).join(Customer, Rental.customer_id == Customer.id) \
+        .join(Book, Rental.book_id == Book.id) \
+        .join(BookType, Book.book_type == BookType.id) \
+        .join(Author, Book.author == Author.id) \
+        .order_by(Rental.id)
+    if start is not None:
+        query = query.filter(Rental.created_at >= start)
+    if end is not None:
+        query = query.filter(Rental.created_at < end + timedelta(days=1))
+
+    for (id, created_at, customer_id, first_name, last_name, book_id, title, book_type_id, book_type,
+         author_first_name, author_last_name, duration, unit_price, total_cost) \
+            in query.yield_per(current_app.config['EXPORT_BATCH_SIZE']):
+        if total_cost is None:
+            total_cost = pricing.cost(book_type_id, duration)
+        yield {
+            'id': id,
+            'rented_at': created_at.isoformat(),
+            'customer_id': customer_id,
+            'customer': f'{first_name} {last_name}',
+            'book_id': book_id,
+            'title': title,
+            'book_type': book_type,
+            'author': f'{author_first_name} {author_last_name}',
+            'duration': duration,
+            'unit_price': None if unit_price is None else str(unit_price),
+            'total_cost': str(total_cost),
+        }
+
+
+def csv_lines(rows):
+    line = io.StringIO()
+    writer = csv.DictWriter(line, fieldnames=LEDGER_FIELDS)
+
+    def take():
+        value = line.getvalue()
+        line.seek(0)
+        line.truncate(0)
+        return value
+
+    writer.writeheader()
+    yield take()
+    for row in rows:
+        writer.writerow(row)
+        yield take()
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(row) + '\n'
+
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', csv_lines),
+    'ndjson': ('application/x-ndjson', ndjson_lines),
+}
@@ -52,7 +52,8 @@ class AuthorForm(FlaskForm):
 
 class BookForm(FlaskForm):
     title = StringField('Book Title', validators=[DataRequired()])
-    author = SelectField("Author", coerce=int, validate_choice=False)
+    # typeahead: the view fills choices with the submitted author, so validation rejects unknown ids
+    author = SelectField("Author", coerce=int, validators=[InputRequired()])
     book_type = SelectField("Type", coerce=int, validate_choice=False)
     submit = SubmitField('Add Book')
 
@@ -71,6 +72,10 @@ class CustomPricingForm(FlaskForm):
     submit = SubmitField('Add Book Type')
 
 
+class ReturnRentalForm(FlaskForm):
+    submit = SubmitField('Return Book')
+
+
 class ConditionPricingForm(FlaskForm):
     condition = StringField('Condition', validators=[DataRequired()])
     submit = SubmitField('Add Condition')
@@ -84,7 +89,8 @@ class CustomerForm(FlaskForm):
 
 
 class RentBookForm(FlaskForm):
-    customer = SelectField("Customer", coerce=int, validate_choice=False)
-    book = SelectMultipleField("Books", coerce=int, validate_choice=False)
+    # typeaheads: the view fills choices with the submitted ids, so validation rejects unknown ones
+    customer = SelectField("Customer", coerce=int, validators=[InputRequired()])
+    book = SelectMultipleField("Books", coerce=int, validators=[InputRequired()])
     duration = IntegerField('No of Days', validators=[DataRequired()])
     submit = SubmitField('Rent Book')
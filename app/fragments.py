@@ -0,0 +1,40 @@
+from flask import request
+from jinja2 import nodes
+from jinja2.ext import Extension
+
+from app import cache, db
+
+
+def version_of(part):
+    if isinstance(part, db.Model):
+        return part.__tablename__, part.id, part.updated_at or part.created_at
+    return part
+
+
+class FragmentCacheExtension(Extension):
+    """
+    {% cache row, related, ... %}...{% endcache %} renders its body once per version of the
+    rows it names and serves it from cache.fragments afterwards.
+
+    Models are keyed on (table, id, updated_at), so an edit renders the fragment again; any
+    other value is part of the key as it is. Name everything the body shows.
+    """
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        parts = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            parts.append(parser.parse_expression())
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        name = nodes.Const(f'{parser.name}:{lineno}')
+        return nodes.CallBlock(self.call_method('_cache', [name, nodes.List(parts)]), [], [], body) \
+            .set_lineno(lineno)
+
+    def _cache(self, name, parts, caller):
+        key = (name, request.script_root) + tuple(version_of(part) for part in parts)
+        return cache.fragments.get(key, lambda key: caller())
+
+
+def init_app(app):
+    app.jinja_env.add_extension(FragmentCacheExtension)
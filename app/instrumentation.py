@@ -0,0 +1,94 @@
+import json
+from collections import Counter
+from time import perf_counter
+
+from flask import current_app, g, has_request_context, request
+from flask import before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class RequestStats(object):
+    def __init__(self):
+        self.started = perf_counter()
+        self.queries = 0
+        self.sql_ms = 0.0
+        self.statements = Counter()
+        self.templates = []
+
+
+def current_stats():
+    if has_request_context():
+        return g.get('sql_stats')
+    return None
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = (perf_counter() - conn.info['query_started'].pop()) * 1000
+    stats = current_stats()
+    if stats is None:
+        return
+    stats.queries += 1
+    stats.sql_ms += elapsed
+    stats.statements[statement] += 1
+    if elapsed >= current_app.config['SQL_SLOW_QUERY_MS']:
+        current_app.logger.warning(json.dumps({
+            'event': 'slow_query',
+            'ms': round(elapsed, 2),
+            'endpoint': request.endpoint,
+            'path': request.path,
+            'template': stats.templates[-1] if stats.templates else None,
+            'statement': statement[:1000],
+        }))
+
+
+def push_template(sender, template, context, **extra):
+    stats = current_stats()
+    if stats is not None:
+        stats.templates.append(template.name)
+
+
+def pop_template(sender, template, context, **extra):
+    stats = current_stats()
+    if stats is not None and stats.templates:
+        stats.templates.pop()
+
+
+def start_request_stats():
+    g.sql_stats = RequestStats()
+
+
+def report_request_stats(response):
+    stats = current_stats()
+    if stats is None:
+        return response
+    total_ms = (perf_counter() - stats.started) * 1000
+    response.headers.add('Server-Timing', f'db;dur={stats.sql_ms:.2f};desc="{stats.queries} queries"')
+    response.headers.add('Server-Timing', f'app;dur={total_ms:.2f}')
+    repeated = stats.statements.most_common(1)
+    current_app.logger.info(json.dumps({
+        'event': 'request',
+        'method': request.method,
+        'path': request.path,
+        'endpoint': request.endpoint,
+        'status': response.status_code,
+        'ms': round(total_ms, 2),
+        'queries': stats.queries,
+        'sql_ms': round(stats.sql_ms, 2),
+        # the same statement run many times in one request is usually an N+1
+        'most_repeated': repeated[0][1] if repeated else 0,
+    }))
+    return response
+
+
+def init_app(app):
+    before_render_template.connect(push_template, app)
+    template_rendered.connect(pop_template, app)
+    app.before_request(start_request_stats)
+    app.after_request(report_request_stats)
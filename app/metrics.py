@@ -0,0 +1,94 @@
+import os
+from time import perf_counter
+
+from flask import request
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest, \
+    CONTENT_TYPE_LATEST
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy import event
+
+from app import db
+from app.instrumentation import current_stats
+from app.routing import REPLICA
+
+REQUEST_LATENCY = Histogram('bookstore_request_duration_seconds', 'Time spent handling a request',
+                            ['method', 'endpoint'])
+REQUESTS = Counter('bookstore_requests_total', 'Responses by endpoint and status', ['method', 'endpoint', 'status'])
+POOL_CHECKOUTS = Counter('bookstore_db_pool_checkouts_total', 'Connections checked out of the pool', ['bind'])
+POOL_CHECKED_OUT = Gauge('bookstore_db_pool_checked_out', 'Connections currently checked out', ['bind'],
+                         multiprocess_mode='livesum')
+POOL_OVERFLOW = Gauge('bookstore_db_pool_overflow', 'Connections opened beyond pool_size', ['bind'],
+                      multiprocess_mode='livesum')
+PDF_RENDER = Histogram('bookstore_pdf_render_seconds', 'Time spent rendering one PDF',
+                       buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60))
+PDF_RENDER_FAILURES = Counter('bookstore_pdf_render_failures_total', 'PDF renders that raised')
+
+
+def observe_request(response):
+    stats = current_stats()
+    if stats is not None:
+        endpoint = request.endpoint or 'unmatched'
+        REQUEST_LATENCY.labels(request.method, endpoint).observe(perf_counter() - stats.started)
+        REQUESTS.labels(request.method, endpoint, response.status_code).inc()
+    return response
+
+
+def instrument_pool(engine, bind):
+    pool = engine.pool
+
+    def update():
+        POOL_CHECKED_OUT.labels(bind).set(pool.checkedout() if hasattr(pool, 'checkedout') else 0)
+        POOL_OVERFLOW.labels(bind).set(max(pool.overflow(), 0) if hasattr(pool, 'overflow') else 0)
+
+    @event.listens_for(engine, 'checkout')
+    def checkout(dbapi_connection, connection_record, connection_proxy):
+        POOL_CHECKOUTS.labels(bind).inc()
+        update()
+
+    @event.listens_for(engine, 'checkin')
+    def checkin(dbapi_connection, connection_record):
+        update()
+
+
+def observe_render(future):
+    if future.cancelled():
+        return
+    if future.exception() is not None:
+        PDF_RENDER_FAILURES.inc()
+    else:
+        PDF_RENDER.observe(future.result())
+
+
+class OutboxCollector(object):
+    """
+    reads the email queue depth from the database at scrape time, so every worker reports the same value
+    """
+
+    def collect(self):
+        from app.outbox import outbox
+
+        yield GaugeMetricFamily('bookstore_email_queue_depth', 'Emails waiting to be sent', value=outbox.depth())
+
+
+def generate():
+    """
+    the Prometheus text exposition for this process, or for every gunicorn worker when
+    PROMETHEUS_MULTIPROC_DIR is set
+    """
+    registry = CollectorRegistry()
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry.register(REGISTRY)
+    registry.register(OutboxCollector())
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def init_app(app):
+    app.after_request(observe_request)
+    with app.app_context():
+        instrument_pool(db.engine, 'default')
+        if REPLICA in (app.config['SQLALCHEMY_BINDS'] or {}):
+            instrument_pool(db.get_engine(app, bind=REPLICA), REPLICA)
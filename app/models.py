@@ -1,9 +1,14 @@
 import jwt
-from datetime import datetime, time
+from datetime import datetime, timedelta
+from time import time
+from flask import current_app
 from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
 from werkzeug.security import generate_password_hash, check_password_hash
 
-from app import app, db, login
+from app import db, login, cache
+from app.pricing import pricing
 
 
 class TimestampMixin(object):
@@ -16,12 +21,19 @@ class User(TimestampMixin, UserMixin, db.Model):
     username = db.Column(db.String(64), index=True, unique=True)
     email = db.Column(db.String(120), index=True, unique=True)
     password_hash = db.Column(db.String(128))
+    session_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     def __repr__(self):
         return '<User {}>'.format(self.username)
 
+    def get_id(self):
+        # the session and the remember-me cookie both carry the version, so a password change ends both
+        return f'{self.id}:{self.session_version or 0}'
+
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
+        # sessions remember the version they logged in with, so this signs out every other session
+        self.session_version = (self.session_version or 0) + 1
 
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
@@ -29,12 +41,12 @@ class User(TimestampMixin, UserMixin, db.Model):
     def get_reset_password_token(self, expires_in=600):
         return jwt.encode(
             {'reset_password': self.id, 'exp': time() + expires_in},
-            app.config['SECRET_KEY'], algorithm='HS256').decode('utf-8')
+            current_app.config['SECRET_KEY'], algorithm='HS256')
 
     @staticmethod
     def verify_reset_password_token(token):
         try:
-            id = jwt.decode(token, app.config['SECRET_KEY'],
+            id = jwt.decode(token, current_app.config['SECRET_KEY'],
                             algorithms=['HS256'])['reset_password']
         except:
             return
@@ -79,7 +91,7 @@ class CustomPricing(TimestampMixin, db.Model):
     special pricing for the different book types
     """
     id = db.Column(db.Integer, primary_key=True)
-    book_type = db.Column(db.Integer, db.ForeignKey('book_type.id'))
+    book_type = db.Column(db.Integer, db.ForeignKey('book_type.id'), index=True)
     minimum_charge = db.Column(db.Numeric(5, 2))
     no_of_days = db.Column(db.Integer)
 
@@ -100,68 +112,248 @@ class ConditionPricing(TimestampMixin, db.Model):
 
 class Book(TimestampMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    book_type = db.Column(db.Integer, db.ForeignKey('book_type.id'))
+    book_type = db.Column(db.Integer, db.ForeignKey('book_type.id'), index=True)
     title = db.Column(db.String(300))
     timestamp = db.Column(db.DateTime, index=True, default=datetime.utcnow)
-    author = db.Column(db.Integer, db.ForeignKey('author.id'))
+    author = db.Column(db.Integer, db.ForeignKey('author.id'), index=True)
+
+    type = db.relationship('BookType')
+    writer = db.relationship('Author')
 
     def __repr__(self):
         return f'Book {self.title}'
 
     def get_author(self):
-        author = Author.query.filter_by(id=self.author).first()
+        author = cache.get_author(self.author)
         return f'{author.first_name} {author.last_name}'
 
     def get_book_type(self):
-        book_type = BookType.query.filter_by(id=self.book_type).first()
-        return book_type.name
+        return cache.get_book_type(self.book_type).name
 
     def get_rent_charge(self):
-        book_type = BookType.query.filter_by(id=self.book_type).first()
-        return book_type.rent_charge
+        return cache.get_book_type(self.book_type).rent_charge
 
 
 class Rental(TimestampMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'))
-    book_id = db.Column(db.Integer, db.ForeignKey('book.id'))
+    book_id = db.Column(db.Integer, db.ForeignKey('book.id'), index=True)
     duration = db.Column(db.Integer)
+    unit_price = db.Column(db.Numeric(5, 2))
+    total_cost = db.Column(db.Numeric(10, 2))
+    due_at = db.Column(db.DateTime)
+    returned_at = db.Column(db.DateTime)
+    overdue_at = db.Column(db.DateTime)
+    late_fee = db.Column(db.Numeric(10, 2))
+
+    __table_args__ = (
+        # per-customer history and statements; also serves lookups on customer_id alone
+        db.Index('ix_rental_customer_id_created_at', 'customer_id', 'created_at'),
+        # date-range filters on the ledger, exports and monthly statements
+        db.Index('ix_rental_created_at', 'created_at'),
+        # the overdue sweep: rentals still out, in due order
+        db.Index('ix_rental_open_due_at', 'due_at', 'id',
+                 postgresql_where=db.text('returned_at IS NULL'), sqlite_where=db.text('returned_at IS NULL')),
+    )
+
+    customer = db.relationship('Customer')
+    book = db.relationship('Book')
 
     def __repr__(self):
-        customer = Customer.query.filter_by(id=self.customer_id).first()
-        book = Book.query.filter_by(id=self.book_id).first()
-        return f'{book.title} has been rented by {customer.first_name} {customer.last_name}'
+        return f'{self.book.title} has been rented by {self.get_customer()}'
+
+    @staticmethod
+    def ledger():
+        """
+        rentals joined to customer, book, author and book type in a single statement
+        """
+        return Rental.query.options(
+            db.joinedload(Rental.customer),
+            db.joinedload(Rental.book).joinedload(Book.type),
+            db.joinedload(Rental.book).joinedload(Book.writer),
+        ).order_by(Rental.id)
 
     def get_customer(self):
-        customer = Customer.query.filter_by(id=self.customer_id).first()
-        return f'{customer.first_name} {customer.last_name}'
+        return f'{self.customer.first_name} {self.customer.last_name}'
 
     def get_title(self):
-        book = Book.query.filter_by(id=self.book_id).first()
-        return book.title
+        return self.book.title
 
     def get_book_type(self):
-        book = Book.query.filter_by(id=self.book_id).first()
-        return book.get_book_type()
+        return self.book.get_book_type()
 
     def get_author(self):
-        book = Book.query.filter_by(id=self.book_id).first()
-        return book.get_author()
+        return self.book.get_author()
+
+    def is_overdue(self, now=None):
+        return self.returned_at is None and self.due_at is not None and self.due_at < (now or datetime.utcnow())
+
+    def return_book(self, now=None):
+        """
+        close the rental, pricing any late fee at return time; the caller commits
+        """
+        now = now or datetime.utcnow()
+        book = self.book
+        # the overdue sweep may have repriced the fee since this rental was loaded
+        db.session.refresh(self, with_for_update=True)
+        pricing.check()
+        fee = pricing.late_fee(book.book_type, self.due_at, now) if self.is_overdue(now) else None
+        if fee != self.late_fee:
+            RentalRollup.record(db.session.connection(), [RentalRollup.late_fee_delta(
+                self.created_at, book.book_type, book.author, self.customer_id, self.late_fee, fee)])
+        self.returned_at = now
+        self.late_fee = fee
+
+    @staticmethod
+    def bulk_create(rentals):
+        """
+        insert (customer_id, book, duration) rentals as a single executemany, priced at write time
+        from rules checked against the database
+        """
+        now = datetime.utcnow()
+        rentals = list(rentals)
+        pricing.check()
+        rows = [{
+            'created_at': now,
+            'customer_id': customer_id,
+            'book_id': book.id,
+            'duration': duration,
+            'due_at': now + timedelta(days=duration),
+            'unit_price': pricing.rate(book.book_type),
+            'total_cost': pricing.cost(book.book_type, duration),
+        } for customer_id, book, duration in rentals]
+        if rows:
+            db.session.execute(Rental.__table__.insert(), rows)
+            RentalRollup.record(db.session.connection(), [
+                RentalRollup.row(now, book.book_type, book.author, customer_id, duration, row['total_cost'])
+                for (customer_id, book, duration), row in zip(rentals, rows)])
+        return len(rows)
 
     def get_cost(self):
-        book = Book.query.filter_by(id=self.book_id).first()
-        book_type = BookType.query.filter_by(id=book.book_type).first()
-        if book_type.name == 'Regular':
-            if self.duration > 2:
-                d = self.duration - 2
-                return (2 * 1) + (d * 1.5)
-            return self.duration * 2
-        if book_type.name == 'Novel':
-            if self.duration < 3:
-                return 4.5
-        return book.get_rent_charge() * self.duration
+        if self.total_cost is not None:
+            return self.total_cost
+        return pricing.cost(self.book.book_type, self.duration)
+
+
+class RentalRollup(db.Model):
+    """
+    rentals, rented days and revenue per day, book type, author and customer, kept up to
+    date as rentals are written so reports never scan the rental table
+    """
+    day = db.Column(db.Date, primary_key=True)
+    book_type_id = db.Column(db.Integer, db.ForeignKey('book_type.id'), primary_key=True)
+    author_id = db.Column(db.Integer, db.ForeignKey('author.id'), primary_key=True)
+    customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'), primary_key=True)
+    rentals = db.Column(db.Integer, nullable=False, default=0)
+    rental_days = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+
+    KEY = ('day', 'book_type_id', 'author_id', 'customer_id')
+
+    @staticmethod
+    def row(created_at, book_type_id, author_id, customer_id, duration, cost, rentals=1):
+        return {'day': created_at.date(), 'book_type_id': book_type_id, 'author_id': author_id,
+                'customer_id': customer_id, 'rentals': rentals, 'rental_days': duration or 0, 'revenue': cost}
+
+    @staticmethod
+    def late_fee_delta(created_at, book_type_id, author_id, customer_id, old_fee, new_fee):
+        return RentalRollup.row(created_at, book_type_id, author_id, customer_id, 0,
+                                (new_fee or 0) - (old_fee or 0), rentals=0)
+
+    @staticmethod
+    def record(connection, rows):
+        """
+        add rows (see row()) to the rollups in the caller's transaction, one upsert per key
+        """
+        totals = {}
+        for row in rows:
+            key = tuple(row[k] for k in RentalRollup.KEY)
+            total = totals.get(key)
+            if total is None:
+                totals[key] = dict(row)
+            else:
+                for column in ('rentals', 'rental_days', 'revenue'):
+                    total[column] += row[column]
+        if not totals:
+            return 0
+
+        table = RentalRollup.__table__
+        dialect = {'postgresql': postgresql, 'sqlite': sqlite}.get(connection.dialect.name)
+        if dialect is not None:
+            insert = dialect.insert(table)
+            connection.execute(insert.on_conflict_do_update(
+                index_elements=list(RentalRollup.KEY),
+                set_={column: table.c[column] + insert.excluded[column]
+                      for column in ('rentals', 'rental_days', 'revenue')},
+            ), list(totals.values()))
+        else:
+            for total in totals.values():
+                match = [table.c[k] == total[k] for k in RentalRollup.KEY]
+                updated = connection.execute(table.update().where(*match).values(
+                    {column: table.c[column] + total[column] for column in ('rentals', 'rental_days', 'revenue')}))
+                if updated.rowcount == 0:
+                    connection.execute(table.insert(), total)
+        return len(totals)
+
+
+@event.listens_for(Rental, 'before_insert')
+def set_due_at(mapper, connection, rental):
+    if rental.due_at is None and rental.duration is not None:
+        if rental.created_at is None:
+            rental.created_at = datetime.utcnow()
+        rental.due_at = rental.created_at + timedelta(days=rental.duration)
+
+
+@event.listens_for(Rental, 'after_insert')
+def rollup_rental(mapper, connection, rental):
+    # rentals added one at a time through the session; bulk_create and the seeder record their own
+    books = Book.__table__
+    book_type, author = connection.execute(
+        db.select([books.c.book_type, books.c.author]).where(books.c.id == rental.book_id)).first()
+    cost = rental.total_cost
+    if cost is None:
+        cost = pricing.cost(book_type, rental.duration)
+    RentalRollup.record(connection, [RentalRollup.row(
+        rental.created_at, book_type, author, rental.customer_id, rental.duration, cost)])
+
+
+class OutboxMessage(TimestampMixin, db.Model):
+    """
+    emails waiting for the outbox sender threads
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    subject = db.Column(db.String(300))
+    sender = db.Column(db.String(120))
+    recipients = db.Column(db.Text)
+    text_body = db.Column(db.Text)
+    html_body = db.Column(db.Text)
+    status = db.Column(db.String(10), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_error = db.Column(db.String(300))
+    sent_at = db.Column(db.DateTime)
+
+    __table_args__ = (db.Index('ix_outbox_message_due', 'status', 'next_attempt_at'),)
+
+    def __repr__(self):
+        return f'OutboxMessage {self.subject} to {self.recipients}'
+
+
+def load_user_row(id):
+    user = User.query.get(id)
+    if user is not None:
+        db.session.expunge(user)
+    return user
 
 
 @login.user_loader
-def load_user(id):
-    return User.query.get(int(id))
+def load_user(user_id):
+    id, _, version = user_id.partition(':')
+    try:
+        id, version = int(id), int(version or 0)
+    except ValueError:
+        return None
+    user = cache.users.get(id, load_user_row)
+    if user is None or (user.session_version or 0) != version:
+        return None
+    return db.session.merge(user, load=False)
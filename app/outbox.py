@@ -0,0 +1,140 @@
+import os
+import smtplib
+import threading
+from datetime import datetime, timedelta
+
+from flask import current_app
+from flask_mail import Message
+
+from app import db, mail
+from app.models import OutboxMessage
+
+
+class Outbox(object):
+    """
+    a durable email queue: messages are written to the outbox_message table and sent by a
+    small pool of threads, each sending a batch over a single SMTP connection.
+
+    A claimed message is leased by pushing next_attempt_at forward, so a worker that dies
+    mid-send only delays it; failures are retried with exponential backoff. Each process starts
+    its senders with its first request (or first enqueue), so messages left pending by an earlier
+    process are picked up without waiting for a new one.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._threads = []
+        self._pid = None
+        self.app = None
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+
+    def init_app(self, app):
+        # a request always runs after gunicorn's fork, in the worker that serves it
+        app.before_request(self.start)
+
+    def enqueue(self, subject, sender, recipients, text_body, html_body):
+        message = OutboxMessage(subject=subject, sender=sender, recipients=','.join(recipients),
+                                text_body=text_body, html_body=html_body)
+        db.session.add(message)
+        db.session.commit()
+        self.start()
+        self._wake.set()
+        return message
+
+    def start(self):
+        # threads do not survive gunicorn's fork, so every worker process starts its own
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self.app = current_app._get_current_object()
+            self._threads = [threading.Thread(target=self.run, name=f'outbox-{i}', daemon=True)
+                             for i in range(current_app.config['MAIL_SENDER_THREADS'])]
+            for thread in self._threads:
+                thread.start()
+
+    def run(self):
+        while True:
+            try:
+                with self.app.app_context():
+                    sent = self.drain()
+            except Exception:
+                self.app.logger.exception('outbox sender failed')
+                sent = 0
+            if not sent:
+                self._wake.wait(self.app.config['MAIL_POLL_INTERVAL'])
+                self._wake.clear()
+
+    def claim(self):
+        now = datetime.utcnow()
+        batch = OutboxMessage.query \
+            .filter(OutboxMessage.status == 'pending', OutboxMessage.next_attempt_at <= now) \
+            .order_by(OutboxMessage.next_attempt_at, OutboxMessage.id) \
+            .limit(current_app.config['MAIL_BATCH_SIZE']) \
+            .with_for_update(skip_locked=True) \
+            .all()
+        for message in batch:
+            message.attempts += 1
+            message.next_attempt_at = now + timedelta(seconds=current_app.config['MAIL_LEASE'])
+        db.session.commit()
+        return batch
+
+    def fail(self, message, error):
+        message.last_error = str(error)[:300]
+        if message.attempts >= current_app.config['MAIL_MAX_ATTEMPTS']:
+            message.status = 'failed'
+            self.failed += 1
+        else:
+            delay = min(current_app.config['MAIL_RETRY_BACKOFF'] * 2 ** (message.attempts - 1), 3600)
+            message.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+            self.retried += 1
+
+    def send_batch(self, batch):
+        try:
+            with mail.connect() as connection:
+                for message in batch:
+                    # anything one message raises (a bad address, an encoding error) fails that
+                    # message only; the ones already delivered must still be committed as sent
+                    try:
+                        connection.send(Message(message.subject, sender=message.sender,
+                                                recipients=message.recipients.split(','),
+                                                body=message.text_body, html=message.html_body))
+                    except Exception as e:
+                        self.fail(message, e)
+                    else:
+                        message.status = 'sent'
+                        message.sent_at = datetime.utcnow()
+                        self.sent += 1
+        except (smtplib.SMTPException, OSError) as e:
+            for message in batch:
+                if message.status == 'pending':
+                    self.fail(message, e)
+        finally:
+            db.session.commit()
+
+    def drain(self):
+        """
+        send every message that is due; returns how many were attempted
+        """
+        attempted = 0
+        while True:
+            batch = self.claim()
+            if not batch:
+                return attempted
+            self.send_batch(batch)
+            attempted += len(batch)
+
+    def depth(self):
+        return OutboxMessage.query.filter(OutboxMessage.status == 'pending').count()
+
+    def stats(self):
+        return {'pending': self.depth(), 'sent': self.sent, 'retried': self.retried, 'failed': self.failed,
+                'threads': sum(t.is_alive() for t in self._threads)}
+
+
+outbox = Outbox()
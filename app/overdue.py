@@ -0,0 +1,66 @@
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import bindparam
+
+from app import db
+from app.models import Book, Rental, RentalRollup
+from app.pricing import pricing
+
+
+def sweep(now=None, batch_size=None):
+    """
+    flag every rental still out past its due date and price its late fee as of `now`.
+
+    Rentals are read in (due_at, id) order off ix_rental_open_due_at, batch_size at a time;
+    each batch is one UPDATE executemany plus one rollup upsert, committed on its own so a
+    long sweep holds no locks for long and can be stopped and rerun. Returns
+    (rentals swept, newly flagged, change in late fees).
+    """
+    now = now or datetime.utcnow()
+    batch_size = batch_size or current_app.config['OVERDUE_BATCH_SIZE']
+    rentals = Rental.__table__
+    # a rental returned since the batch was read keeps the fee return_book gave it
+    update = rentals.update().where(rentals.c.id == bindparam('rental_id'), rentals.c.returned_at.is_(None)) \
+        .values(overdue_at=bindparam('flagged_at'), late_fee=bindparam('fee'), updated_at=now)
+
+    swept = flagged = charged = 0
+    after = None
+    while True:
+        query = db.session.query(
+            Rental.id, Rental.due_at, Rental.overdue_at, Rental.late_fee, Rental.created_at, Rental.customer_id,
+            Book.book_type, Book.author,
+        ).join(Book, Rental.book_id == Book.id) \
+            .filter(Rental.returned_at.is_(None), Rental.due_at < now) \
+            .order_by(Rental.due_at, Rental.id)
+        if after is not None:
+            due_at, id = after
+            query = query.filter(db.or_(Rental.due_at > due_at, db.and_(Rental.due_at == due_at, Rental.id > id)))
+        # FOR UPDATE holds off returns on PostgreSQL; SQLite has one writer at a time anyway
+        batch = query.limit(batch_size).with_for_update(of=Rental).all()
+        if not batch:
+            break
+        pricing.check()
+
+        fees = {row.id: pricing.late_fee(row.book_type, row.due_at, now) for row in batch}
+        db.session.execute(update, [{'rental_id': row.id, 'flagged_at': row.overdue_at or now, 'fee': fees[row.id]}
+                                    for row in batch])
+        # the UPDATE holds the write lock now, so this sees every return that beat it
+        returned = {id for id, in db.session.query(Rental.id).filter(
+            Rental.id.in_(list(fees)), Rental.returned_at.isnot(None))}
+
+        rollups = []
+        for id, due_at, overdue_at, old_fee, created_at, customer_id, book_type, author in batch:
+            if id in returned:
+                continue
+            fee = fees[id]
+            if fee != old_fee:
+                rollups.append(RentalRollup.late_fee_delta(created_at, book_type, author, customer_id, old_fee, fee))
+                charged += fee - (old_fee or 0)
+            flagged += overdue_at is None
+            swept += 1
+        RentalRollup.record(db.session.connection(), rollups)
+        db.session.commit()
+
+        after = batch[-1].due_at, batch[-1].id
+    return swept, flagged, charged
@@ -0,0 +1,67 @@
+from flask import current_app, request
+from sqlalchemy import select
+
+
+class KeysetPage(object):
+    """
+    a page of rows ordered by a unique, increasing key (the primary key).
+
+    ?after=<key> walks forward and ?before=<key> walks back, so the cost of a page
+    does not depend on how deep into the table it is.
+    """
+
+    def __init__(self, query, key, after=None, before=None, per_page=None):
+        per_page = clamp(per_page)
+        query = query.order_by(None)
+        if before is not None:
+            rows = query.filter(key < before).order_by(key.desc()).limit(per_page + 1).all()
+            self.has_prev = len(rows) > per_page
+            self.has_next = True
+            rows = rows[:per_page][::-1]
+        else:
+            if after is not None:
+                query = query.filter(key > after)
+            rows = query.order_by(key).limit(per_page + 1).all()
+            self.has_next = len(rows) > per_page
+            self.has_prev = after is not None
+            rows = rows[:per_page]
+        self.items = rows
+        self.per_page = per_page
+        self.next_cursor = key_of(rows[-1], key) if rows and self.has_next else None
+        self.prev_cursor = key_of(rows[0], key) if rows and self.has_prev else None
+
+    def __iter__(self):
+        return iter(self.items)
+
+
+def clamp(per_page):
+    per_page = per_page or current_app.config['PER_PAGE']
+    return max(1, min(per_page, current_app.config['MAX_PER_PAGE']))
+
+
+def key_of(row, key):
+    return getattr(row, key.key)
+
+
+def paginate(query, key):
+    return KeysetPage(query, key,
+                      after=request.args.get('after', type=int),
+                      before=request.args.get('before', type=int),
+                      per_page=request.args.get('per_page', type=int))
+
+
+def page_keys(key):
+    """
+    the keys of the rows paginate() reads for this request, including the one that decides
+    has_next/has_prev, as a subquery; cheap however large the table is
+    """
+    after = request.args.get('after', type=int)
+    before = request.args.get('before', type=int)
+    keys = select(key)
+    if before is not None:
+        keys = keys.where(key < before).order_by(key.desc())
+    else:
+        if after is not None:
+            keys = keys.where(key > after)
+        keys = keys.order_by(key)
+    return keys.limit(clamp(request.args.get('per_page', type=int)) + 1)
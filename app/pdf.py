@@ -0,0 +1,92 @@
+import hashlib
+import multiprocessing
+import os
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from time import perf_counter
+
+from flask import current_app
+
+from app import metrics
+
+_lock = threading.RLock()
+_pool = None
+_pool_pid = None
+_pending = {}
+
+
+def write_pdf(html, base_url, path):
+    """
+    runs in a pool process: render html to a temporary file and move it into place.
+
+    Returns the render time in seconds.
+    """
+    from weasyprint import HTML
+
+    started = perf_counter()
+    tmp = f'{path}.{os.getpid()}.tmp'
+    HTML(string=html, base_url=base_url).write_pdf(tmp)
+    os.replace(tmp, path)
+    return perf_counter() - started
+
+
+def mp_context():
+    # forking a gevent-patched worker would copy its hub into the render processes; start them clean
+    if 'gevent.monkey' in sys.modules and sys.modules['gevent.monkey'].is_module_patched('os'):
+        return multiprocessing.get_context('spawn')
+    return None
+
+
+def get_pool():
+    # gunicorn forks workers after import, so each worker process starts its own pool
+    global _pool, _pool_pid
+    with _lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ProcessPoolExecutor(max_workers=current_app.config['PDF_WORKERS'], mp_context=mp_context())
+            _pool_pid = os.getpid()
+            _pending.clear()
+        return _pool
+
+
+def submit(html, base_url, path):
+    future = get_pool().submit(write_pdf, html, base_url, path)
+    future.add_done_callback(metrics.observe_render)
+    return future
+
+
+def cache_path(*parts):
+    """
+    the cache file for a statement built from `parts`, e.g. (rental id, updated_at, ...)
+    """
+    key = hashlib.sha256(repr(parts).encode('utf-8')).hexdigest()
+    directory = current_app.config['PDF_CACHE_DIR']
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f'{key}.pdf')
+
+
+def statement_path(rental):
+    # everything the statement shows: the rental, its customer, and the book's title, author and type
+    return cache_path('statement', rental.id, rental.updated_at or rental.created_at,
+                      rental.customer.updated_at, rental.book.updated_at, rental.book.writer.updated_at,
+                      rental.book.type.updated_at)
+
+
+def render(html, base_url, path, timeout=None):
+    """
+    render html to path in the process pool, sharing one render between concurrent requests.
+
+    Returns True once the file exists, False if the render is still running after `timeout`.
+    """
+    if os.path.exists(path):
+        return True
+    with _lock:
+        future = _pending.get(path)
+        if future is None:
+            future = _pending[path] = submit(html, base_url, path)
+            future.add_done_callback(lambda f: _pending.pop(path, None))
+    try:
+        future.result(timeout=current_app.config['PDF_RENDER_TIMEOUT'] if timeout is None else timeout)
+    except TimeoutError:
+        return False
+    return True
@@ -0,0 +1,210 @@
+import threading
+from collections import namedtuple
+from decimal import Decimal
+from time import monotonic
+
+from flask import current_app
+from sqlalchemy import select
+
+from app import db
+
+CENTS = Decimal('0.01')
+
+# cost of renting for `d` days:
+#   d <= included_days -> max(short_minimum, short_rate * d)
+#   d >  included_days -> base + extra_rate * (d - included_days)
+Rule = namedtuple('Rule', 'included_days short_rate short_minimum base extra_rate')
+
+
+class UnknownBookType(LookupError):
+    """
+    a book with no book type, or one that does not exist, cannot be priced
+    """
+
+    def __init__(self, book_type_id):
+        super().__init__(f'no pricing for book type {book_type_id}')
+        self.book_type_id = book_type_id
+
+
+def flat_rule(rate):
+    return Rule(0, rate, Decimal(0), Decimal(0), rate)
+
+
+def custom_rule(rate, minimum_charge, no_of_days):
+    """
+    the minimum charge covers the first no_of_days days, every extra day is charged at the book type rate
+    """
+    return Rule(no_of_days, Decimal(0), minimum_charge, minimum_charge, rate)
+
+
+def legacy_rule(name, rate):
+    """
+    the rules Rental.get_cost used to hard-code by book type name
+    """
+    if name == 'Regular':
+        return Rule(2, Decimal(2), Decimal(0), Decimal(2), Decimal('1.5'))
+    if name == 'Novel':
+        return Rule(2, Decimal(0), Decimal('4.5'), rate * 2, rate)
+    return flat_rule(rate)
+
+
+def as_decimal(value):
+    return Decimal(str(value or 0))
+
+
+def evaluate(rule, duration):
+    if duration <= rule.included_days:
+        cost = max(rule.short_minimum, rule.short_rate * duration)
+    else:
+        cost = rule.base + rule.extra_rate * (duration - rule.included_days)
+    return cost.quantize(CENTS)
+
+
+def to_cents(value):
+    return int((value * 100).to_integral_value())
+
+
+def format_cents(cents):
+    return '%d.%02d' % divmod(int(cents), 100)
+
+
+def evaluate_grid(rules, durations):
+    """
+    evaluate() for every rule against every duration at once: `rules` is a sequence of Rules,
+    the result a len(rules) x len(durations) array of integer cents.
+
+    Rates carry at most two decimal places, so integer cents give the same answer as the
+    Decimal arithmetic in evaluate().
+    """
+    import numpy as np
+
+    columns = np.array([[rule.included_days] + [to_cents(v) for v in rule[1:]] for rule in rules],
+                       dtype=np.int64).reshape(-1, 5).T[:, :, np.newaxis]
+    included_days, short_rate, short_minimum, base, extra_rate = columns
+    d = np.asarray(durations, dtype=np.int64)[np.newaxis, :]
+    return np.where(d <= included_days,
+                    np.maximum(short_minimum, short_rate * d),
+                    base + extra_rate * (d - included_days))
+
+
+class PricingTable(object):
+    """
+    BookType and CustomPricing rows compiled into an in-process rule table.
+
+    The table is rebuilt lazily after invalidate() or once PRICING_TTL seconds have passed,
+    so workers that did not see the edit converge on their own. Writes that store a price
+    call check() first, which compares the tables' version and never prices from stale rules.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rules = None
+        self._rates = {}
+        self._version = None
+        self._loaded_at = 0
+
+    def invalidate(self):
+        self._rules = None
+
+    def version(self):
+        """
+        row count and newest change of BookType and CustomPricing, read in one small SELECT
+        """
+        from app.conditional import table_state
+        from app.models import BookType, CustomPricing
+
+        return tuple(db.session.execute(select(*table_state(BookType), *table_state(CustomPricing))).one())
+
+    def load(self):
+        from app.models import BookType, CustomPricing
+
+        version = self.version()
+        # only book types flagged custom_pricing use their CustomPricing row, the first one added
+        custom = {}
+        for cp in CustomPricing.query.join(BookType, CustomPricing.book_type == BookType.id) \
+                .filter(BookType.custom_pricing.is_(True)).order_by(CustomPricing.id):
+            custom.setdefault(cp.book_type, cp)
+        rules, rates = {}, {}
+        for bt in BookType.query:
+            rate = rates[bt.id] = as_decimal(bt.rent_charge)
+            cp = custom.get(bt.id)
+            if cp is not None:
+                rules[bt.id] = custom_rule(rate, as_decimal(cp.minimum_charge), cp.no_of_days or 0)
+            else:
+                rules[bt.id] = legacy_rule(bt.name, rate)
+        self._loaded_at = monotonic()
+        self._version = version
+        self._rates = rates
+        self._rules = rules
+        return rules
+
+    def check(self):
+        """
+        reload the rules if BookType or CustomPricing changed since they were compiled, even in
+        another worker; write paths call this before snapshotting a price
+        """
+        if self._rules is None or self._version != self.version():
+            with self._lock:
+                self.load()
+
+    @property
+    def rules(self):
+        rules = self._rules
+        if rules is None or monotonic() - self._loaded_at > current_app.config['PRICING_TTL']:
+            with self._lock:
+                rules = self._rules
+                if rules is None or monotonic() - self._loaded_at > current_app.config['PRICING_TTL']:
+                    rules = self.load()
+        return rules
+
+    def rule(self, book_type_id):
+        """
+        the compiled rule for a book type; raises UnknownBookType
+        """
+        if book_type_id is None:
+            raise UnknownBookType(book_type_id)
+        rule = self.rules.get(book_type_id)
+        if rule is None:
+            # a book type created after the table was compiled; reloads only if the tables changed
+            self.check()
+            rule = self._rules.get(book_type_id)
+            if rule is None:
+                raise UnknownBookType(book_type_id)
+        return rule
+
+    def rate(self, book_type_id):
+        self.rule(book_type_id)
+        return self._rates[book_type_id]
+
+    def cost(self, book_type_id, duration):
+        return evaluate(self.rule(book_type_id), duration or 0)
+
+    def quote(self, book_type_ids, durations):
+        """
+        price every book type against every duration without touching the database; returns a
+        len(book_type_ids) x len(durations) array of costs in cents. Raises UnknownBookType
+        """
+        import numpy as np
+
+        if None in book_type_ids:
+            raise UnknownBookType(None)
+        distinct, rows = np.unique(np.asarray(book_type_ids, dtype=np.int64), return_inverse=True)
+        rule = self.rule
+        return evaluate_grid([rule(int(book_type_id)) for book_type_id in distinct], durations)[rows.reshape(-1)]
+
+    def late_fee(self, book_type_id, due_at, now):
+        """
+        every whole day past due_at, charged at the book type's daily rate as it is now
+        """
+        days = max((now - due_at).days, 0)
+        return (self.rule(book_type_id).extra_rate * days).quantize(CENTS)
+
+    def price_many(self, items):
+        """
+        price an iterable of (book_type_id, duration) pairs without touching the database
+        """
+        rule = self.rule
+        return [evaluate(rule(book_type_id), duration or 0) for book_type_id, duration in items]
+
+
+pricing = PricingTable()
@@ -0,0 +1,118 @@
+from datetime import date, timedelta
+from decimal import Decimal, InvalidOperation
+
+from flask import current_app
+from sqlalchemy import and_, func, literal, or_, tuple_
+
+from app import db
+from app.models import Author, Book, BookType, Customer, Rental, RentalRollup
+from app.pagination import clamp
+from app.pricing import pricing
+
+# report dimension -> rollup column
+DIMENSIONS = {
+    'day': RentalRollup.day,
+    'book_type': RentalRollup.book_type_id,
+    'author': RentalRollup.author_id,
+    'customer': RentalRollup.customer_id,
+}
+
+
+def labels(dimension, ids):
+    if dimension == 'book_type':
+        return {id: name for id, name in db.session.query(BookType.id, BookType.name).filter(BookType.id.in_(ids))}
+    if dimension in ('author', 'customer'):
+        model = Author if dimension == 'author' else Customer
+        return {id: f'{first} {last}' for id, first, last in
+                db.session.query(model.id, model.first_name, model.last_name).filter(model.id.in_(ids))}
+    return {}
+
+
+def parse_cursor(cursor, by):
+    """
+    'revenue,key,...' from report()'s next cursor -> (Decimal, [key per dimension]); raises ValueError
+    """
+    values = cursor.split(',')
+    if len(values) != len(by) + 1:
+        raise ValueError(cursor)
+    try:
+        revenue = Decimal(values[0])
+    except InvalidOperation:
+        raise ValueError(cursor)
+    return revenue, [date.fromisoformat(v) if d == 'day' else int(v) for d, v in zip(by, values[1:])]
+
+
+def report(start=None, end=None, by=('day',), after=None, per_page=None):
+    """
+    rentals, rented days and revenue grouped by the `by` dimensions, read from the rollups only.
+
+    `start` and `end` are inclusive days; rows come back largest revenue first, per_page at a time.
+    Returns (rows, next cursor or None); pass the cursor back as `after` for the following page.
+    """
+    per_page = clamp(per_page)
+    columns = [DIMENSIONS[d] for d in by]
+    # rounded to cents so a cursor taken from one page compares equal to its group on the next
+    revenue = func.round(func.sum(RentalRollup.revenue), 2)
+    query = db.session.query(
+        *columns, func.sum(RentalRollup.rentals), func.sum(RentalRollup.rental_days), revenue,
+    ).group_by(*columns).order_by(revenue.desc(), *columns)
+    if start is not None:
+        query = query.filter(RentalRollup.day >= start.date())
+    if end is not None:
+        query = query.filter(RentalRollup.day <= end.date())
+    if after is not None:
+        last, keys = parse_cursor(after, by)
+        last = literal(last, RentalRollup.revenue.type)
+        query = query.having(or_(revenue < last, and_(revenue == last, tuple_(*columns) > tuple_(*keys))))
+    rows = query.limit(per_page + 1).all()
+    more, rows = len(rows) > per_page, rows[:per_page]
+
+    names = {d: labels(d, {row[i] for row in rows}) for i, d in enumerate(by)}
+    results = []
+    for row in rows:
+        result = {}
+        for i, d in enumerate(by):
+            result[d] = row[i].isoformat() if d == 'day' else {'id': row[i], 'name': names[d].get(row[i])}
+        rentals, rental_days, revenue = row[len(by):]
+        result.update(rentals=int(rentals), rental_days=int(rental_days), revenue=f'{Decimal(revenue):.2f}')
+        results.append(result)
+    cursor = None
+    if more:
+        last = rows[-1]
+        cursor = ','.join([results[-1]['revenue']] + [v.isoformat() if d == 'day' else str(v)
+                                                       for d, v in zip(by, last)])
+    return results, cursor
+
+
+def rebuild(start=None, end=None):
+    """
+    recompute the rollups for the inclusive day range (everything by default) from the rentals,
+    for backfills and after bulk edits that bypass Rental.bulk_create; returns the rentals read
+    """
+    rollups = RentalRollup.query
+    rentals = db.session.query(
+        Rental.created_at, Book.book_type, Book.author, Rental.customer_id, Rental.duration, Rental.total_cost,
+        Rental.late_fee,
+    ).join(Book, Rental.book_id == Book.id).order_by(Rental.id)
+    if start is not None:
+        rollups = rollups.filter(RentalRollup.day >= start.date())
+        rentals = rentals.filter(Rental.created_at >= start)
+    if end is not None:
+        rollups = rollups.filter(RentalRollup.day <= end.date())
+        rentals = rentals.filter(Rental.created_at < end + timedelta(days=1))
+    rollups.delete(synchronize_session=False)
+
+    batch_size = current_app.config['EXPORT_BATCH_SIZE']
+    connection = db.session.connection()
+    read, batch = 0, []
+    for created_at, book_type, author, customer_id, duration, total_cost, late_fee in rentals.yield_per(batch_size):
+        if total_cost is None:
+            total_cost = pricing.cost(book_type, duration)
+        batch.append(RentalRollup.row(created_at, book_type, author, customer_id, duration,
+                                      total_cost + (late_fee or 0)))
+        if len(batch) == batch_size:
+            RentalRollup.record(connection, batch)
+            read, batch = read + len(batch), []
+    RentalRollup.record(connection, batch)
+    db.session.commit()
+    return read + len(batch)
@@ -1,38 +1,56 @@
-from flask import render_template, flash, redirect, url_for, request
+import codecs
+import csv
+import os
+from datetime import datetime
+
+from flask import render_template, flash, redirect, url_for, request, jsonify, make_response, send_file, abort, \
+    Response, stream_with_context, current_app, Blueprint
+from sqlalchemy import select
 from werkzeug.urls import url_parse
-from flask_weasyprint import HTML, render_pdf
 from flask_login import current_user, login_user, logout_user, login_required
 
-from app import app, db
+from app import db, cache, metrics, pdf
+from app.catalog import CatalogImport
+from app.conditional import conditional, page_state, table_state
 from app.email import send_password_reset_email
+from app.exports import EXPORT_FORMATS, ledger_rows, parse_day
+from app.outbox import outbox
+from app.pagination import paginate, page_keys
+from app.pricing import pricing, format_cents, UnknownBookType
+from app.reports import DIMENSIONS, report
+from app.routing import read_only
+from app.statements import render_statement, statement_archive, month_range, count_customers
 from app.forms import LoginForm, BookForm, CustomerForm, AuthorForm, RegistrationForm, RentBookForm, \
-    ResetPasswordRequestForm, ResetPasswordForm, BookTypeForm, CustomPricingForm, ConditionPricingForm
+    ResetPasswordRequestForm, ResetPasswordForm, BookTypeForm, CustomPricingForm, ConditionPricingForm, \
+    ReturnRentalForm
 from app.models import User, Book, BookType, Author, Customer, Rental, CustomPricing, ConditionPricing
 
+bp = Blueprint('main', __name__)
 
-@app.route('/')
-@app.route('/login', methods=['GET', 'POST'])
+
+@bp.route('/')
+@bp.route('/login', methods=['GET', 'POST'])
 def login():
     if current_user.is_authenticated:
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
     form = LoginForm()
     if form.validate_on_submit():
         user = User.query.filter_by(username=form.username.data).first()
         if user is None or not user.check_password(form.password.data):
             flash('Invalid username or password')
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
         login_user(user, remember=form.remember_me.data)
         next_page = request.args.get('next')
         if not next_page or url_parse(next_page).netloc != '':
-            next_page = url_for('index')
+            next_page = url_for('main.index')
         return redirect(next_page)
     return render_template('login.html', title='Sign In', form=form)
 
 
-@app.route('/register', methods=['GET', 'POST'])
+@bp.route('/register', methods=['GET', 'POST'])
 def register():
     if current_user.is_authenticated:
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
     form = RegistrationForm()
     if form.validate_on_submit():
         user = User(username=form.username.data, email=form.email.data)
@@ -40,84 +58,271 @@ def register():
         db.session.add(user)
         db.session.commit()
         flash('Congratulations, you are now a registered user!')
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
     return render_template('register.html', title='Register', form=form)
 
 
-@app.route('/reset_password_request', methods=['GET', 'POST'])
+@bp.route('/reset_password_request', methods=['GET', 'POST'])
 def reset_password_request():
     if current_user.is_authenticated:
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
     form = ResetPasswordRequestForm()
     if form.validate_on_submit():
         user = User.query.filter_by(email=form.email.data).first()
         if user:
             send_password_reset_email(user)
         flash('Check your email for the instructions to reset your password')
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
     return render_template('reset_password_request.html',
                            title='Reset Password', form=form)
 
 
-@app.route('/reset_password/<token>', methods=['GET', 'POST'])
+@bp.route('/reset_password/<token>', methods=['GET', 'POST'])
 def reset_password(token):
     if current_user.is_authenticated:
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
     user = User.verify_reset_password_token(token)
     if not user:
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
     form = ResetPasswordForm()
     if form.validate_on_submit():
         user.set_password(form.password.data)
         db.session.commit()
+        cache.users.invalidate(user.id)
         flash('Your password has been reset.')
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
     return render_template('reset_password.html', form=form)
 
 
-@app.route('/logout')
+@bp.route('/logout')
 def logout():
     logout_user()
-    return redirect(url_for('index'))
+    return redirect(url_for('main.index'))
+
+
+def ledger_page_state():
+    # the rentals on the page, the customers, books and authors they show, and the pricing tables
+    page = Rental.id.in_(page_keys(Rental.id))
+    books = select(Rental.book_id).where(page)
+    return page_state(Rental.id) \
+        + table_state(Customer, Customer.id.in_(select(Rental.customer_id).where(page))) \
+        + table_state(Book, Book.id.in_(books)) \
+        + table_state(Author, Author.id.in_(select(Book.author).where(Book.id.in_(books)))) \
+        + table_state(BookType) + table_state(CustomPricing)
+
 
+def books_page_state():
+    page = Book.id.in_(page_keys(Book.id))
+    return page_state(Book.id) + table_state(Author, Author.id.in_(select(Book.author).where(page))) \
+        + table_state(BookType)
 
-@app.route('/home')
+
+@bp.route('/home')
 @login_required
+@read_only
+@conditional(ledger_page_state)
 def index():
-    rentals = Rental.query.all()
+    rentals = paginate(Rental.ledger(), Rental.id)
     return render_template('index.html', title='Home', rentals=rentals)
 
 
-@app.route('/rent/book', methods=['GET', 'POST'])
+@bp.route('/rent/book', methods=['GET', 'POST'])
 @login_required
 def rent_book():
-    customers = [(i.id, f'{i.first_name} {i.last_name}') for i in Customer.query.all()]
-    books = [(i.id, f'{i.title} @ ${i.get_rent_charge()}') for i in Book.query.all()]
-    book_type = BookType.query.all
     form = RentBookForm()
-    form.customer.choices = customers
-    form.book.choices = books
+    form.customer.choices = choices_for(Customer, [form.customer.data], customer_choice)
+    form.customer.render_kw = {'data-search-url': url_for('main.search_customers')}
+    form.book.choices = choices_for(Book, form.book.data or [], book_choice)
+    form.book.render_kw = {'data-search-url': url_for('main.search_books')}
     if form.validate_on_submit():
-        for i in form.book.data:
-            r = Rental(
-                customer_id=form.customer.data,
-                book_id=i,
-                duration=form.duration.data
-            )
-            db.session.add(r)
-            db.session.commit()
-        return redirect(url_for('index'))
+        books = Book.query.filter(Book.id.in_(form.book.data))
+        Rental.bulk_create((form.customer.data, book, form.duration.data) for book in books)
+        db.session.commit()
+        return redirect(url_for('main.index'))
     return render_template('rent_book.html', title='Rent A Book', form=form)
 
 
-@app.route('/book/types')
+@bp.route('/return/rental/<id>', methods=['GET', 'POST'])
+@login_required
+def return_rental(id):
+    rental = Rental.ledger().filter(Rental.id == id).first_or_404()
+    if rental.returned_at is not None:
+        flash(f'{rental.get_title()} was already returned.')
+        return redirect(url_for('main.index'))
+    form = ReturnRentalForm()
+    if form.validate_on_submit():
+        rental.return_book()
+        db.session.commit()
+        if rental.late_fee:
+            flash(f'{rental.get_title()} has been returned with a ${rental.late_fee} late fee.')
+        else:
+            flash(f'{rental.get_title()} has been returned.')
+        return redirect(url_for('main.index'))
+    late_fee = pricing.late_fee(rental.book.book_type, rental.due_at, datetime.utcnow()) \
+        if rental.is_overdue() else None
+    return render_template('return_rental.html', title='Return A Book', form=form, rental=rental, late_fee=late_fee)
+
+
+@bp.route('/api/rentals', methods=['POST'])
+@login_required
+def create_rentals():
+    payload = request.get_json(silent=True) or {}
+    entries = payload.get('rentals')
+    if not isinstance(entries, list) or not entries:
+        return jsonify(error='expected a non-empty "rentals" list'), 400
+    try:
+        entries = [(int(e['customer_id']), [int(b) for b in e['book_ids']], int(e['duration'])) for e in entries]
+    except (KeyError, TypeError, ValueError):
+        return jsonify(error='each rental needs customer_id, book_ids and duration'), 400
+
+    book_ids = {b for _, ids, _ in entries for b in ids}
+    customer_ids = {c for c, _, _ in entries}
+    books = {b.id: b for b in Book.query.filter(Book.id.in_(book_ids))}
+    known_customers = {c for c, in db.session.query(Customer.id).filter(Customer.id.in_(customer_ids))}
+    errors = []
+    for i, (customer_id, ids, duration) in enumerate(entries):
+        if customer_id not in known_customers:
+            errors.append({'index': i, 'error': f'unknown customer {customer_id}'})
+        missing = [b for b in ids if b not in books]
+        if missing:
+            errors.append({'index': i, 'error': f'unknown books {missing}'})
+        if duration < 1:
+            errors.append({'index': i, 'error': 'duration must be at least one day'})
+    if errors:
+        return jsonify(errors=errors), 400
+
+    created = Rental.bulk_create(
+        (customer_id, books[b], duration) for customer_id, ids, duration in entries for b in ids)
+    db.session.commit()
+    return jsonify(created=created), 201
+
+
+@bp.route('/api/quote', methods=['POST'])
+@login_required
+@read_only
+def quote():
+    payload = request.get_json(silent=True) or {}
+    try:
+        book_ids = [int(b) for b in payload['book_ids']]
+        durations = [int(d) for d in payload['durations']]
+    except (KeyError, TypeError, ValueError):
+        return jsonify(error='expected "book_ids" and "durations" lists of integers'), 400
+    if not book_ids or not durations or min(durations) < 1:
+        return jsonify(error='at least one book and one duration of a day or more'), 400
+    if len(book_ids) * len(durations) > current_app.config['QUOTE_MAX_CELLS']:
+        return jsonify(error=f'at most {current_app.config["QUOTE_MAX_CELLS"]} book and duration pairs'), 400
+
+    book_types = dict(db.session.query(Book.id, Book.book_type).filter(Book.id.in_(set(book_ids))))
+    missing = sorted(set(book_ids) - set(book_types))
+    if missing:
+        return jsonify(error=f'unknown books {missing}'), 400
+    try:
+        costs = pricing.quote([book_types[b] for b in book_ids], durations)
+    except UnknownBookType as e:
+        return jsonify(error=str(e)), 400
+    return jsonify(
+        durations=durations,
+        quotes=[{'book_id': b, 'costs': [format_cents(c) for c in row]} for b, row in zip(book_ids, costs.tolist())],
+        totals=[format_cents(c) for c in costs.sum(axis=0).tolist()],
+    )
+
+
+@bp.route('/api/catalog/import', methods=['POST'])
+@login_required
+def import_catalog():
+    """
+    a catalog CSV uploaded as the "file" form field or sent as the text/csv request body
+    """
+    upload = request.files.get('file')
+    stream = upload.stream if upload is not None else request.stream
+    try:
+        report = CatalogImport().run(codecs.iterdecode(stream, 'utf-8-sig'))
+    except (ValueError, csv.Error) as e:
+        return jsonify(error=str(e)), 400
+    return jsonify(report)
+
+
+def customer_choice(customer):
+    return customer.id, f'{customer.first_name} {customer.last_name}'
+
+
+def author_choice(author):
+    return author.id, f'{author.first_name} {author.last_name}'
+
+
+def book_choice(book):
+    return book.id, f'{book.title} @ ${book.get_rent_charge()}'
+
+
+def choices_for(model, ids, choice):
+    """
+    select choices for the rows already picked on the form; the rest come from the search endpoints
+    """
+    ids = [i for i in ids if i is not None]
+    if not ids:
+        return []
+    return [choice(row) for row in model.query.filter(model.id.in_(ids))]
+
+
+def prefix_search(model, columns, choice):
+    q = request.args.get('q', '').strip().lower()
+    query = model.query
+    if q:
+        pattern = q.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        query = query.filter(db.or_(*[db.func.lower(c).like(pattern, escape='\\') for c in columns]))
+    rows = query.order_by(model.id).limit(current_app.config['SEARCH_LIMIT'])
+    return jsonify(results=[dict(zip(('id', 'text'), choice(row))) for row in rows])
+
+
+@bp.route('/api/customers/search')
 @login_required
+def search_customers():
+    return prefix_search(Customer, [Customer.first_name, Customer.last_name, Customer.email], customer_choice)
+
+
+@bp.route('/api/authors/search')
+@login_required
+def search_authors():
+    return prefix_search(Author, [Author.first_name, Author.last_name, Author.email], author_choice)
+
+
+@bp.route('/api/books/search')
+@login_required
+def search_books():
+    return prefix_search(Book, [Book.title], book_choice)
+
+
+@bp.route('/api/cache/stats')
+@login_required
+def cache_stats():
+    return jsonify(pid=os.getpid(), **cache.stats())
+
+
+@bp.route('/api/outbox/stats')
+@login_required
+def outbox_stats():
+    return jsonify(pid=os.getpid(), **outbox.stats())
+
+
+@bp.route('/metrics')
+def get_metrics():
+    # scraped by Prometheus, which cannot log in; set METRICS_TOKEN to require a bearer token
+    token = current_app.config['METRICS_TOKEN']
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        abort(403)
+    body, content_type = metrics.generate()
+    return Response(body, content_type=content_type)
+
+
+@bp.route('/book/types')
+@login_required
+@conditional(lambda: page_state(BookType.id) + table_state(CustomPricing))
 def get_book_types():
-    book_types = BookType.query.all()
+    book_types = paginate(BookType.query, BookType.id)
     return render_template('book_types.html', title='BookTypes', book_types=book_types)
 
 
-@app.route('/add/book/type', methods=['GET', 'POST'])
+@bp.route('/add/book/type', methods=['GET', 'POST'])
 @login_required
 def add_book_type():
     form = BookTypeForm()
@@ -128,22 +333,26 @@ def add_book_type():
         )
         db.session.add(book_type)
         db.session.commit()
-        return redirect(url_for('get_book_types'))
+        cache.book_types.invalidate(book_type.id)
+        pricing.invalidate()
+        return redirect(url_for('main.get_book_types'))
     return render_template('add_book_type.html', title='Add Book', form=form)
 
 
-@app.route('/edit/book/type/<id>', methods=['GET', 'POST'])
+@bp.route('/edit/book/type/<id>', methods=['GET', 'POST'])
 @login_required
 def edit_book_type(id):
     book_type = BookType.query.filter_by(id=id).first()
     form = BookTypeForm()
     if form.validate_on_submit():
-        book_type.name = form.name.data,
-        book_type.rent_charge = form.rent_charge.data,
+        book_type.name = form.name.data
+        book_type.rent_charge = form.rent_charge.data
         book_type.custom_pricing = form.custom_pricing.data
         db.session.commit()
+        cache.book_types.invalidate(book_type.id)
+        pricing.invalidate()
         flash('Book Type has been updated.')
-        return redirect(url_for('get_book_types'))
+        return redirect(url_for('main.get_book_types'))
     book_type = BookType.query.filter_by(id=id).first()
     form.name.data = book_type.name
     form.rent_charge.data = book_type.rent_charge
@@ -151,21 +360,22 @@ def edit_book_type(id):
     return render_template('edit_book_type.html', title='Save Book Type', form=form)
 
 
-@app.route('/books')
+@bp.route('/books')
 @login_required
+@read_only
+@conditional(books_page_state)
 def get_books():
-    books = Book.query.all()
+    books = paginate(Book.query, Book.id)
     return render_template('books.html', title='Books', books=books)
 
 
-@app.route('/add/book', methods=['GET', 'POST'])
+@bp.route('/add/book', methods=['GET', 'POST'])
 @login_required
 def add_book():
-    authors = [(i.id, f'{i.first_name} {i.last_name}') for i in Author.query.all()]
-    book_types = [(i.id, f'{i.name} {i.rent_charge}') for i in BookType.query.all()]
     form = BookForm()
-    form.author.choices = authors
-    form.book_type.choices = book_types
+    form.author.choices = choices_for(Author, [form.author.data], author_choice)
+    form.author.render_kw = {'data-search-url': url_for('main.search_authors')}
+    form.book_type.choices = [(i.id, f'{i.name} {i.rent_charge}') for i in BookType.query.all()]
     if form.validate_on_submit():
         book = Book(
             title=form.title.data,
@@ -174,40 +384,41 @@ def add_book():
         )
         db.session.add(book)
         db.session.commit()
-        return redirect(url_for('get_books'))
+        return redirect(url_for('main.get_books'))
     return render_template('add_book.html', title='Add Book', form=form)
 
 
-@app.route('/edit/book/<id>', methods=['GET', 'POST'])
+@bp.route('/edit/book/<id>', methods=['GET', 'POST'])
 @login_required
 def edit_book(id):
-    book = Book.query.filter_by(id=id).first()
-    authors = [(i.id, f'{i.first_name} {i.last_name}') for i in Author.query.all()]
-    book_types = [(i.id, f'{i.name} {i.rent_charge}') for i in BookType.query.all()]
+    book = Book.query.filter_by(id=id).first_or_404()
     form = BookForm()
-    form.author.choices = authors
-    form.book_type.choices = book_types
+    form.book_type.choices = [(i.id, f'{i.name} {i.rent_charge}') for i in BookType.query.all()]
+    if not form.is_submitted():
+        form.title.data = book.title
+        form.author.data = book.author
+        form.book_type.data = book.book_type
+    form.author.choices = choices_for(Author, [form.author.data], author_choice)
+    form.author.render_kw = {'data-search-url': url_for('main.search_authors')}
     if form.validate_on_submit():
-        book.title = form.title.data,
-        book.book_type = form.book_type.data,
+        book.title = form.title.data
+        book.book_type = form.book_type.data
         book.author = form.author.data
         db.session.commit()
         flash('Book has been updated.')
-        return redirect(url_for('get_books'))
-    book = Book.query.filter_by(id=id).first()
-    form.title.data = book.title
-    form.author.data = book.author
+        return redirect(url_for('main.get_books'))
     return render_template('edit_book.html', title='Save Book', form=form)
 
 
-@app.route('/authors')
+@bp.route('/authors')
 @login_required
+@conditional(lambda: page_state(Author.id))
 def get_authors():
-    authors = Author.query.all()
+    authors = paginate(Author.query, Author.id)
     return render_template('authors.html', title='Authors', authors=authors)
 
 
-@app.route('/add/author', methods=['GET', 'POST'])
+@bp.route('/add/author', methods=['GET', 'POST'])
 @login_required
 def add_author():
     form = AuthorForm()
@@ -219,18 +430,21 @@ def add_author():
         )
         db.session.add(author)
         db.session.commit()
-        return redirect(url_for('get_authors'))
+        cache.authors.invalidate(author.id)
+        return redirect(url_for('main.get_authors'))
     return render_template('add_author.html', title='Add Author', form=form)
 
 
-@app.route('/customers')
+@bp.route('/customers')
 @login_required
+@read_only
+@conditional(lambda: page_state(Customer.id))
 def get_customers():
-    customers = Customer.query.all()
+    customers = paginate(Customer.query, Customer.id)
     return render_template('customers.html', title='Customers', customers=customers)
 
 
-@app.route('/add/customer', methods=['GET', 'POST'])
+@bp.route('/add/customer', methods=['GET', 'POST'])
 @login_required
 def add_customer():
     form = CustomerForm()
@@ -242,36 +456,141 @@ def add_customer():
         )
         db.session.add(customer)
         db.session.commit()
-        return redirect(url_for('get_customers'))
+        return redirect(url_for('main.get_customers'))
     return render_template('add_customer.html', title='Add Customer', form=form)
 
 
-@app.route('/view/statement/<id>', methods=['GET'])
+def statement_state(id):
+    # the rental, the rows its statement shows and the tables its cost is priced from
+    return table_state(Rental, Rental.id == id) \
+        + table_state(Customer, Customer.id == Rental.customer_id, Rental.id == id) \
+        + table_state(Book, Book.id == Rental.book_id, Rental.id == id) \
+        + table_state(Author, Author.id == Book.author, Book.id == Rental.book_id, Rental.id == id) \
+        + table_state(BookType) + table_state(CustomPricing)
+
+
+@bp.route('/view/statement/<id>', methods=['GET'])
 @login_required
+@read_only
+@conditional(statement_state)
 def get_statement(id):
-    rental = Rental.query.filter_by(id=id).first()
-    return render_template('statement.html', title='Customer Receipt', rental=rental)
+    rental = Rental.ledger().filter(Rental.id == id).first_or_404()
+    return render_statement(rental.customer, [rental], printable=True)
 
 
-@app.route('/print/statement/<id>', methods=['GET'])
+@bp.route('/print/statement/<id>', methods=['GET'])
 @login_required
+@read_only
+@conditional(statement_state)
 def print_statement(id):
-    rental = Rental.query.filter_by(id=id).first()
-    html = render_template('statement.html', rental=rental)
-    return render_pdf(HTML(string=html), download_filename=rental.get_customer())
+    rental = Rental.ledger().filter(Rental.id == id).first_or_404()
+    path = pdf.statement_path(rental)
+    if not os.path.exists(path):
+        html = render_statement(rental.customer, [rental])
+        if not pdf.render(html, request.url_root, path):
+            response = make_response('The statement is being prepared, please retry shortly.', 202)
+            response.headers['Retry-After'] = '2'
+            return response
+    return send_file(path, mimetype='application/pdf', as_attachment=True,
+                     attachment_filename=f'{rental.get_customer()}.pdf')
+
+
+@bp.route('/statements/<month>.zip', methods=['GET'])
+@login_required
+@read_only
+def export_statements(month):
+    try:
+        start, end = month_range(month)
+    except ValueError:
+        abort(404)
+    total = count_customers(start, end)
+    done = []
+
+    def progress(name):
+        done.append(name)
+        current_app.logger.info('statements %s: %d/%d', month, len(done), total)
+
+    response = Response(stream_with_context(statement_archive(month, progress)), mimetype='application/zip')
+    response.headers['Content-Disposition'] = f'attachment; filename=statements-{month}.zip'
+    return response
 
 
-@app.route('/custom/pricing')
+@bp.route('/export/rentals.<fmt>', methods=['GET'])
+@login_required
+@read_only
+def export_rentals(fmt):
+    if fmt not in EXPORT_FORMATS:
+        abort(404)
+    try:
+        start = parse_day(request.args.get('from'))
+        end = parse_day(request.args.get('to'))
+    except ValueError:
+        return jsonify(error='from and to must be YYYY-MM-DD dates'), 400
+    mimetype, lines = EXPORT_FORMATS[fmt]
+    response = Response(stream_with_context(lines(ledger_rows(start, end))), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename=rentals.{fmt}'
+    return response
+
+
+def report_args():
+    """
+    from, to and by (repeated or comma separated) from the query string; raises ValueError
+    """
+    start = parse_day(request.args.get('from'))
+    end = parse_day(request.args.get('to'))
+    by = [d for value in request.args.getlist('by') for d in value.split(',') if d] or ['day']
+    if any(d not in DIMENSIONS for d in by):
+        raise ValueError(by)
+    return start, end, list(dict.fromkeys(by))
+
+
+@bp.route('/reports', methods=['GET'])
+@login_required
+@read_only
+def get_reports():
+    try:
+        start, end, by = report_args()
+        rows, next_cursor = report(start, end, by, after=request.args.get('after'),
+                                   per_page=request.args.get('per_page', type=int))
+    except ValueError:
+        flash('Pick dimensions from the list and YYYY-MM-DD dates')
+        start, end, by = None, None, ['day']
+        rows, next_cursor = report(start, end, by)
+    return render_template('reports.html', title='Reports', rows=rows, next_cursor=next_cursor, by=by,
+                           dimensions=DIMENSIONS, start=start, end=end)
+
+
+@bp.route('/api/reports', methods=['GET'])
+@login_required
+@read_only
+def api_reports():
+    try:
+        start, end, by = report_args()
+        rows, next_cursor = report(start, end, by, after=request.args.get('after'),
+                                   per_page=request.args.get('per_page', type=int))
+    except ValueError:
+        return jsonify(error=f'by must be among {", ".join(DIMENSIONS)}; from and to YYYY-MM-DD dates; '
+                             f'after a cursor from a previous page'), 400
+    return jsonify(by=by, rows=rows, next=next_cursor)
+
+
+@bp.route('/custom/pricing')
 @login_required
+@conditional(lambda: page_state(CustomPricing.id))
 def get_custom_pricing():
-    custom_prices = CustomPricing.query.all()
+    custom_prices = paginate(CustomPricing.query, CustomPricing.id)
     return render_template('custom_pricing.html', title='CustomPricing', custom_prices=custom_prices)
 
 
-@app.route('/add/custom/pricing/<book_type_id>', methods=['GET', 'POST'])
+@bp.route('/add/custom/pricing/<book_type_id>', methods=['GET', 'POST'])
 @login_required
 def add_custom_pricing(book_type_id):
-    book_type = BookType.query.filter_by(id=book_type_id).first()
+    book_type = BookType.query.filter_by(id=book_type_id).first_or_404()
+    existing = CustomPricing.query.filter_by(book_type=book_type.id).order_by(CustomPricing.id).first()
+    if existing is not None:
+        # a book type has one custom pricing; change it rather than adding another
+        flash('This book type already has custom pricing.')
+        return redirect(url_for('main.edit_custom_pricing', id=existing.id))
     form = CustomPricingForm()
     if form.validate_on_submit():
         custom_price = CustomPricing(
@@ -281,37 +600,38 @@ def add_custom_pricing(book_type_id):
         )
         db.session.add(custom_price)
         db.session.commit()
-        return redirect(url_for('get_custom_pricing'))
+        pricing.invalidate()
+        return redirect(url_for('main.get_custom_pricing'))
     return render_template('add_custom_pricing.html', title='Add Custom Pricing', form=form)
 
 
-@app.route('/edit/custom/pricing/<id>', methods=['GET', 'POST'])
+@bp.route('/edit/custom/pricing/<id>', methods=['GET', 'POST'])
 @login_required
 def edit_custom_pricing(id):
     custom_pricing = CustomPricing.query.filter_by(id=id).first()
     form = CustomPricingForm()
     if form.validate_on_submit():
-        custom_pricing.book_type = form.book_type.data,
-        custom_pricing.minimum_charge = form.minimum_charge.data,
+        custom_pricing.minimum_charge = form.minimum_charge.data
         custom_pricing.no_of_days = form.no_of_days.data
         db.session.commit()
+        pricing.invalidate()
         flash('Custom Pricing has been updated.')
-        return redirect(url_for('get_book_types'))
+        return redirect(url_for('main.get_book_types'))
     custom_pricing = CustomPricing.query.filter_by(id=id).first()
-    form.name.data = custom_pricing.book_type
     form.minimum_charge.data = custom_pricing.minimum_charge
     form.no_of_days.data = custom_pricing.no_of_days
     return render_template('edit_custom_pricing.html', title='Save Custom Pricing', form=form)
 
 
-@app.route('/condition/pricing')
+@bp.route('/condition/pricing')
 @login_required
+@conditional(lambda: page_state(ConditionPricing.id))
 def get_condition_pricing():
-    condition_prices = ConditionPricing.query.all()
+    condition_prices = paginate(ConditionPricing.query, ConditionPricing.id)
     return render_template('conditions.html', title='CustomPricing', condition_prices=condition_prices)
 
 
-@app.route('/add/condition/pricing', methods=['GET', 'POST'])
+@bp.route('/add/condition/pricing', methods=['GET', 'POST'])
 @login_required
 def add_condition_pricing():
     form = ConditionPricingForm()
@@ -321,5 +641,5 @@ def add_condition_pricing():
         )
         db.session.add(cp)
         db.session.commit()
-        return redirect(url_for('get_custom_pricing'))
+        return redirect(url_for('main.get_custom_pricing'))
     return render_template('add_condition.html', title='Add Condition Pricing', form=form)
\ No newline at end of file
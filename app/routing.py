@@ -0,0 +1,34 @@
+from flask import current_app, has_request_context, request
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import orm
+
+REPLICA = 'replica'
+
+
+def in_read_only_view():
+    if not has_request_context() or request.endpoint is None:
+        return False
+    return getattr(current_app.view_functions.get(request.endpoint), 'read_only', False)
+
+
+class RoutingSession(SignallingSession):
+    """
+    sends the reads of views marked @read_only to the replica bind, when one is configured.
+
+    Flushes always go to the primary, so a read-only view that does write stays correct.
+    """
+
+    def get_bind(self, mapper=None, clause=None):
+        if not self._flushing and REPLICA in (self.app.config['SQLALCHEMY_BINDS'] or {}) and in_read_only_view():
+            return self.app.extensions['sqlalchemy'].db.get_engine(self.app, bind=REPLICA)
+        return super(RoutingSession, self).get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+def read_only(view):
+    view.read_only = True
+    return view
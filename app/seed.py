@@ -0,0 +1,107 @@
+import random
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from app import db
+from app.models import Author, Book, BookType, Customer, Rental, RentalRollup, User
+from app.pricing import pricing
+
+FIRST_NAMES = ['Jane', 'Jude', 'Wanjiru', 'Otieno', 'Amina', 'Kamau', 'Achieng', 'Mwangi', 'Grace', 'Peter',
+               'Njeri', 'Brian', 'Fatuma', 'Kevin', 'Mercy', 'Daniel', 'Akinyi', 'Samuel', 'Lucy', 'Hassan']
+LAST_NAMES = ['Doe', 'Law', 'Ngugi', 'Odhiambo', 'Mohamed', 'Kariuki', 'Wambui', 'Kiprop', 'Mutua', 'Owino',
+              'Chege', 'Wekesa', 'Njoroge', 'Atieno', 'Omondi', 'Kimani', 'Barasa', 'Maina', 'Nyambura', 'Ali']
+TITLE_WORDS = ['River', 'Between', 'Mask', 'Petals', 'Blood', 'Weep', 'Child', 'Grain', 'Wheat', 'Devil',
+               'Cross', 'Wizard', 'Crow', 'Dreams', 'Season', 'Migration', 'North', 'Harvest', 'Thorns', 'Coast']
+BOOK_TYPES = [('Regular', Decimal('1.5')), ('Fiction', Decimal('3.0')), ('Novel', Decimal('1.5'))]
+
+BATCH_SIZE = 5000
+
+
+def insert(model, rows):
+    for i in range(0, len(rows), BATCH_SIZE):
+        db.session.execute(model.__table__.insert(), rows[i:i + BATCH_SIZE])
+
+
+def people(rng, n, domain, offset):
+    now = datetime.utcnow()
+    return [{
+        'created_at': now,
+        'first_name': rng.choice(FIRST_NAMES),
+        'last_name': rng.choice(LAST_NAMES),
+        'email': f'person{offset + i}@{domain}',
+    } for i in range(n)]
+
+
+def seed(scale, rentals_per_customer=5, days=365, random_seed=0):
+    """
+    add `scale` customers, scale / 10 authors, scale / 2 books and about
+    rentals_per_customer * scale rentals spread over the last `days` days.
+
+    Rows are appended, so seeding twice doubles the data; returns the counts inserted.
+    """
+    rng = random.Random(random_seed)
+    now = datetime.utcnow()
+
+    types = {bt.name: bt for bt in BookType.query}
+    missing = [BookType(name=name, rent_charge=charge) for name, charge in BOOK_TYPES if name not in types]
+    db.session.add_all(missing)
+    db.session.flush()
+    type_ids = [bt.id for bt in BookType.query]
+
+    customer_offset = Customer.query.count()
+    author_offset = Author.query.count()
+    n_authors = max(1, scale // 10)
+    n_books = max(1, scale // 2)
+    insert(Customer, people(rng, scale, 'customers.example.com', customer_offset))
+    insert(Author, people(rng, n_authors, 'authors.example.com', author_offset))
+    db.session.flush()
+
+    author_ids = [a for a, in db.session.query(Author.id).order_by(Author.id.desc()).limit(n_authors)]
+    insert(Book, [{
+        'created_at': now,
+        'timestamp': now,
+        'title': ' '.join(rng.sample(TITLE_WORDS, rng.randint(2, 4))).title(),
+        'book_type': rng.choice(type_ids),
+        'author': rng.choice(author_ids),
+    } for _ in range(n_books)])
+    db.session.flush()
+
+    customer_ids = [c for c, in db.session.query(Customer.id).order_by(Customer.id.desc()).limit(scale)]
+    books = db.session.query(Book.id, Book.book_type, Book.author).order_by(Book.id.desc()).limit(n_books).all()
+    pricing.invalidate()
+    rates = {bt.id: bt.rent_charge for bt in BookType.query}
+    rentals, rollups = [], []
+    for _ in range(scale * rentals_per_customer):
+        book_id, book_type, author = rng.choice(books)
+        duration = rng.randint(1, 14)
+        created_at = now - timedelta(days=rng.uniform(0, days))
+        due_at = created_at + timedelta(days=duration)
+        # most books come back by the due date, a few late and a few not yet
+        returned_at = created_at + timedelta(days=rng.uniform(0, duration * rng.choice([1, 1, 1, 1.5])))
+        rentals.append({
+            'created_at': created_at,
+            'customer_id': rng.choice(customer_ids),
+            'book_id': book_id,
+            'duration': duration,
+            'due_at': due_at,
+            'returned_at': returned_at if returned_at < now and rng.random() < 0.98 else None,
+            'unit_price': rates[book_type],
+            'total_cost': pricing.cost(book_type, duration),
+        })
+        rental = rentals[-1]
+        rollups.append(RentalRollup.row(rental['created_at'], book_type, author, rental['customer_id'], duration,
+                                        rental['total_cost']))
+    insert(Rental, rentals)
+    RentalRollup.record(db.session.connection(), rollups)
+    db.session.commit()
+    return {'customers': scale, 'authors': n_authors, 'books': n_books, 'rentals': len(rentals)}
+
+
+def ensure_user(username, password, email=None):
+    user = User.query.filter_by(username=username).first()
+    if user is None:
+        user = User(username=username, email=email or f'{username}@example.com')
+        user.set_password(password)
+        db.session.add(user)
+        db.session.commit()
+    return user
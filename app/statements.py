@@ -0,0 +1,102 @@
+import os
+import tempfile
+import zipfile
+from collections import deque
+from datetime import datetime
+from itertools import groupby
+from operator import attrgetter
+
+from flask import current_app, has_request_context, render_template, request
+from werkzeug.utils import secure_filename
+
+from app import pdf
+from app.models import Rental
+
+
+def render_statement(customer, rentals, title='Customer Receipt', printable=False):
+    total = sum(r.get_cost() for r in rentals)
+    return render_template('statement.html', title=title, customer=customer, rentals=rentals, total=total,
+                           printable=printable)
+
+
+def month_range(month):
+    """
+    'YYYY-MM' -> (first day of the month, first day of the next month)
+    """
+    start = datetime.strptime(month, '%Y-%m')
+    if start.month == 12:
+        return start, start.replace(year=start.year + 1, month=1)
+    return start, start.replace(month=start.month + 1)
+
+
+def month_rentals(start, end):
+    return Rental.ledger().filter(Rental.created_at >= start, Rental.created_at < end)
+
+
+def customer_rentals(start, end):
+    """
+    yield (customer, rentals) for every customer with rentals in [start, end), one customer in memory at a time
+    """
+    query = month_rentals(start, end).order_by(None).order_by(Rental.customer_id, Rental.id)
+    for _, group in groupby(query.yield_per(current_app.config['STATEMENT_BATCH_SIZE']), key=attrgetter('customer_id')):
+        rentals = list(group)
+        yield rentals[0].customer, rentals
+
+
+def count_customers(start, end):
+    return month_rentals(start, end).order_by(None).with_entities(Rental.customer_id).distinct().count()
+
+
+class ChunkBuffer(object):
+    """
+    a write-only file object that hands back whatever has been written since the last take()
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data, self.chunks = b''.join(self.chunks), []
+        return data
+
+
+def statement_archive(month, progress=None):
+    """
+    yield a ZIP of one PDF statement per customer for `month` as it is built.
+
+    HTML is rendered here (it needs the database and templates) and the PDFs in the pool,
+    with at most twice PDF_WORKERS renders in flight so memory stays bounded.
+    """
+    start, end = month_range(month)
+    base_url = request.url_root if has_request_context() else None
+    window = current_app.config['PDF_WORKERS'] * 2
+    buffer = ChunkBuffer()
+    pending = deque()
+
+    with tempfile.TemporaryDirectory() as tmp, zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        def add_next():
+            name, path, future = pending.popleft()
+            future.result()
+            archive.write(path, name)
+            os.remove(path)
+            if progress is not None:
+                progress(name)
+            return buffer.take()
+
+        for customer, rentals in customer_rentals(start, end):
+            name = f'{month}/{customer.id}-{secure_filename(customer.first_name + "-" + customer.last_name)}.pdf'
+            path = os.path.join(tmp, f'{customer.id}.pdf')
+            html = render_statement(customer, rentals, title=f'Statement {month}')
+            pending.append((name, path, pdf.submit(html, base_url, path)))
+            if len(pending) >= window:
+                yield add_next()
+        while pending:
+            yield add_next()
+    yield buffer.take()
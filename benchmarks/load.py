@@ -0,0 +1,167 @@
+"""
+Load-test the gunicorn serving profiles (see gunicorn.conf.py) on a mixed workload of
+list pages, searches, statements and PDF downloads, and report throughput and latency.
+
+    python benchmarks/load.py --profiles sync gthread gevent --clients 32 --duration 10
+
+Every SQL statement is delayed by --db-latency milliseconds to stand in for the network
+round trip to a database server; with 0 the SQLite file answers instantly and the
+profiles only differ in CPU overhead.
+"""
+import argparse
+import http.cookiejar
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'load.db'))
+os.environ.setdefault('MAIL_SENDER_THREADS', '0')
+
+from sqlalchemy import event  # noqa: E402
+
+from app import create_app, db  # noqa: E402
+from app.models import Rental  # noqa: E402
+from app.seed import seed, ensure_user  # noqa: E402
+
+app = create_app()
+
+WORKLOAD = [
+    '/home',
+    '/books',
+    '/customers',
+    '/api/books/search?q=the',
+    '/view/statement/{rental}',
+    '/home',
+    '/api/customers/search?q=ja',
+    '/print/statement/{rental}',
+]
+
+PROFILES = {
+    'sync': {'WEB_WORKER_CLASS': 'sync'},
+    'gthread': {'WEB_WORKER_CLASS': 'gthread'},
+    'gevent': {'WEB_WORKER_CLASS': 'gevent'},
+}
+
+if os.environ.get('LOAD_DB_LATENCY_MS'):
+    # imported by gunicorn as load:app; time.sleep yields under gevent like a socket read would
+    latency = float(os.environ['LOAD_DB_LATENCY_MS']) / 1000
+
+    with app.app_context():
+        @event.listens_for(db.engine, 'before_cursor_execute')
+        def delay(*args):
+            time.sleep(latency)
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))]
+
+
+def prepare(scale):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        seed(scale)
+        ensure_user('load', 'load')
+        return Rental.query.order_by(Rental.id.desc()).first().id
+
+
+def client(base, urls, deadline, offset, timings, errors):
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+    page = opener.open(base + '/login').read().decode('utf-8')
+    token = re.search(r'name="csrf_token" type="hidden" value="([^"]+)"', page).group(1)
+    opener.open(base + '/login', urllib.parse.urlencode(
+        {'csrf_token': token, 'username': 'load', 'password': 'load'}).encode('ascii')).read()
+    i = offset
+    while time.perf_counter() < deadline:
+        url = urls[i % len(urls)]
+        i += 1
+        started = time.perf_counter()
+        try:
+            opener.open(base + url, timeout=60).read()
+        except (urllib.error.URLError, OSError):
+            errors.append(url)
+            continue
+        timings.append((time.perf_counter() - started) * 1000)
+
+
+def wait_ready(base, process, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise SystemExit('gunicorn exited during startup')
+        try:
+            urllib.request.urlopen(base + '/login', timeout=1).read()
+            return
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.2)
+    raise SystemExit('gunicorn did not start')
+
+
+def run_profile(name, args, urls):
+    env = dict(os.environ, WEB_CONCURRENCY=str(args.workers), WEB_THREADS=str(args.threads),
+               WEB_WORKER_CONNECTIONS=str(args.clients), LOAD_DB_LATENCY_MS=str(args.db_latency),
+               **PROFILES[name])
+    base = f'http://127.0.0.1:{args.port}'
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', os.path.join(ROOT, 'gunicorn.conf.py'),
+         '--pythonpath', os.path.join(ROOT, 'benchmarks'), '-b', f'127.0.0.1:{args.port}', 'load:app'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_ready(base, process)
+        timings, errors = [], []
+        deadline = time.perf_counter() + args.duration
+        threads = [threading.Thread(target=client, args=(base, urls, deadline, i, timings, errors))
+                   for i in range(args.clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        process.terminate()
+        process.wait()
+    return {
+        'requests': len(timings),
+        'errors': len(errors),
+        'rps': round(len(timings) / args.duration, 1),
+        'p50_ms': round(percentile(timings, 50), 1) if timings else None,
+        'p95_ms': round(percentile(timings, 95), 1) if timings else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--profiles', nargs='+', choices=sorted(PROFILES), default=['sync', 'gthread', 'gevent'])
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=8, help='threads per gthread worker')
+    parser.add_argument('--clients', type=int, default=32, help='concurrent clients')
+    parser.add_argument('--duration', type=float, default=10, help='seconds per profile')
+    parser.add_argument('--db-latency', type=float, default=5, help='milliseconds added to every statement')
+    parser.add_argument('--scale', type=int, default=200)
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args(argv)
+
+    rental = prepare(args.scale) // 2
+    urls = [url.format(rental=rental) for url in WORKLOAD]
+    print(f'{args.clients} clients, {args.workers} workers, {args.db_latency}ms per statement')
+    print(f'{"profile":10} {"req/s":>8} {"p50":>8} {"p95":>8} {"errors":>7}')
+    baseline = None
+    for name in args.profiles:
+        result = run_profile(name, args, urls)
+        baseline = baseline or result['rps']
+        print(f'{name:10} {result["rps"]:8.1f} {result["p50_ms"]:8} {result["p95_ms"]:8} {result["errors"]:7d}'
+              f'   x{result["rps"] / baseline:.1f}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,80 @@
+"""
+Compare pricing a grid of books x durations with Rental.get_cost in a loop against the
+vectorised pricing.quote behind /api/quote.
+
+    python benchmarks/quotes.py --books 50 500 --durations 14 60 --repeat 5
+
+Both sides start from the same compiled pricing table, so neither touches the database;
+the quotes are checked to match cent for cent.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'quotes.db'))
+os.environ.setdefault('MAIL_SENDER_THREADS', '0')
+
+from app import create_app, db  # noqa: E402
+from app.models import Book, BookType, CustomPricing, Rental  # noqa: E402
+from app.pricing import pricing, to_cents  # noqa: E402
+from app.seed import seed  # noqa: E402
+
+app = create_app()
+
+
+def loop(books, durations):
+    return [[Rental(book=book, duration=d).get_cost() for d in durations] for book in books]
+
+
+def vectorised(books, durations):
+    return pricing.quote([book.book_type for book in books], durations)
+
+
+def timed(fn, repeat):
+    runs = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        runs.append((time.perf_counter() - started) * 1000)
+    return statistics.median(runs), result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--books', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--durations', type=int, nargs='+', default=[14, 60])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        seed(max(args.books) * 2, rentals_per_customer=0)
+        # one book type on custom pricing so every kind of rule is in the grid
+        book_type = BookType.query.first()
+        book_type.custom_pricing = True
+        db.session.add(CustomPricing(book_type=book_type.id, minimum_charge=4.5, no_of_days=3))
+        db.session.commit()
+        pricing.invalidate()
+        pricing.quote([BookType.query.first().id], [1])
+
+        print(f'{"books":>6} {"days":>5} {"cells":>8} {"get_cost loop":>14} {"quote":>9}')
+        for n in args.books:
+            books = Book.query.order_by(Book.id).limit(n).all()
+            for m in args.durations:
+                durations = list(range(1, m + 1))
+                slow, expected = timed(lambda: loop(books, durations), args.repeat)
+                fast, costs = timed(lambda: vectorised(books, durations), args.repeat)
+                assert costs.tolist() == [[to_cents(c) for c in row] for row in expected]
+                print(f'{n:6d} {m:5d} {n * m:8d} {slow:12.1f}ms {fast:7.2f}ms   x{slow / fast:.0f}')
+            db.session.expunge_all()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,181 @@
+"""
+Drive every page of the app through the Flask test client at several data scales and
+record latency percentiles and SQL query counts per route.
+
+    python benchmarks/routes.py --scales 100 1000 --save benchmarks/baseline.json
+    python benchmarks/routes.py --scales 100 1000 --baseline benchmarks/baseline.json
+
+With --baseline the run fails if a route issues more queries than before, or its p50
+latency grew by more than --tolerance.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db'))
+os.environ.setdefault('MAIL_SENDER_THREADS', '0')
+
+from sqlalchemy import event  # noqa: E402
+
+from app import create_app, db  # noqa: E402
+from app.models import Book, Rental  # noqa: E402
+from app.seed import seed, ensure_user  # noqa: E402
+
+app = create_app()
+
+ROUTES = [
+    '/home',
+    '/home?after={rental}',
+    '/books',
+    '/authors',
+    '/customers',
+    '/book/types',
+    '/custom/pricing',
+    '/condition/pricing',
+    '/rent/book',
+    '/add/book',
+    '/edit/book/{book}',
+    '/view/statement/{rental}',
+    '/print/statement/{rental}',
+    '/api/customers/search?q=ja',
+    '/api/authors/search?q=k',
+    '/api/books/search?q=the',
+    '/export/rentals.csv?from={month}-01',
+    '/export/rentals.ndjson?from={month}-01',
+    '/reports?by=day,book_type',
+    '/api/reports?by=book_type,author&per_page=500',
+]
+
+# pages that need a specific row, a file upload or a POST body are covered indirectly
+SKIPPED = {'login', 'logout', 'register', 'reset_password_request', 'reset_password', 'static', 'add_author',
+           'add_customer', 'add_book_type', 'edit_book_type', 'add_custom_pricing', 'edit_custom_pricing',
+           'add_condition_pricing', 'create_rentals', 'export_statements'}
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))]
+
+
+class QueryCounter(object):
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args, **kwargs):
+        self.count += 1
+
+
+def uncovered_endpoints():
+    covered = set()
+    adapter = app.url_map.bind('localhost')
+    for route in ROUTES:
+        path = route.split('?')[0].format(rental=1, book=1, month='2021-01')
+        covered.add(adapter.match(path)[0].rsplit('.', 1)[-1])
+    endpoints = {rule.endpoint.rsplit('.', 1)[-1] for rule in app.url_map.iter_rules() if 'GET' in rule.methods}
+    return sorted(endpoints - covered - SKIPPED)
+
+
+def run_scale(scale, repeat):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        started = time.perf_counter()
+        seed(scale)
+        seeded = time.perf_counter() - started
+        ensure_user('bench', 'bench')
+        params = {'rental': Rental.query.order_by(Rental.id.desc()).first().id // 2,
+                  'book': Book.query.first().id,
+                  'month': time.strftime('%Y-%m')}
+
+    client = app.test_client()
+    client.post('/login', data=dict(username='bench', password='bench'))
+    counter = QueryCounter()
+    results = {}
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', counter)
+    try:
+        for route in ROUTES:
+            url = route.format(**params)
+            client.get(url)  # warm caches and the PDF pool
+            timings, queries = [], []
+            for _ in range(repeat):
+                counter.count = 0
+                started = time.perf_counter()
+                response = client.get(url)
+                response.get_data()
+                timings.append((time.perf_counter() - started) * 1000)
+                queries.append(counter.count)
+                if response.status_code >= 400:
+                    raise SystemExit(f'{url} returned {response.status_code}')
+            results[route] = {
+                'p50_ms': round(percentile(timings, 50), 2),
+                'p95_ms': round(percentile(timings, 95), 2),
+                'p99_ms': round(percentile(timings, 99), 2),
+                'queries': max(queries),
+            }
+    finally:
+        with app.app_context():
+            event.remove(db.engine, 'before_cursor_execute', counter)
+    return {'seed_s': round(seeded, 2), 'routes': results}
+
+
+def compare(current, baseline, tolerance):
+    failures = []
+    for scale, run in current.items():
+        previous = baseline.get(scale)
+        if previous is None:
+            continue
+        for route, stats in run['routes'].items():
+            before = previous['routes'].get(route)
+            if before is None:
+                continue
+            if stats['queries'] > before['queries']:
+                failures.append(f'[{scale}] {route}: {before["queries"]} -> {stats["queries"]} queries')
+            if stats['p50_ms'] > before['p50_ms'] * (1 + tolerance):
+                failures.append(f'[{scale}] {route}: p50 {before["p50_ms"]}ms -> {stats["p50_ms"]}ms')
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', type=int, nargs='+', default=[100, 1000])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--baseline', help='JSON results to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='allowed p50 slowdown, 0.5 = 50%%')
+    parser.add_argument('--save', help='write the results to this JSON file')
+    args = parser.parse_args(argv)
+
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    missing = uncovered_endpoints()
+    if missing:
+        print(f'warning: no benchmark for {", ".join(missing)}')
+
+    results = {}
+    for scale in args.scales:
+        results[str(scale)] = run = run_scale(scale, args.repeat)
+        print(f'\nscale {scale} (seeded in {run["seed_s"]}s)')
+        print(f'{"route":45} {"p50":>8} {"p95":>8} {"p99":>8} {"queries":>8}')
+        for route, stats in run['routes'].items():
+            print(f'{route:45} {stats["p50_ms"]:8.2f} {stats["p95_ms"]:8.2f} {stats["p99_ms"]:8.2f} '
+                  f'{stats["queries"]:8d}')
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as f:
+            failures = compare(results, json.load(f), args.tolerance)
+        if failures:
+            print('\nregressions against baseline:')
+            print('\n'.join(failures))
+            return 1
+        print('\nno regressions against baseline')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""
+Measure how long the app takes to start, in a fresh interpreter and under gunicorn with
+and without preload_app.
+
+    python benchmarks/startup.py --workers 4 --repeat 5
+
+"import" is `create_app()` in a new Python process. "gunicorn" is the time from launch
+until the first response, and the CPU seconds the master and its workers spent getting
+there: without preload every worker imports the app itself.
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ['weasyprint', 'flask_weasyprint', 'cairocffi', 'cairosvg', 'PIL', 'numpy']
+
+IMPORT = f"""
+import json, sys, time
+started = time.perf_counter()
+from app import create_app
+create_app()
+print(json.dumps({{'seconds': time.perf_counter() - started, 'heavy': [m for m in {HEAVY!r} if m in sys.modules]}}))
+"""
+
+
+def child_cpu():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def time_import(env):
+    output = subprocess.run([sys.executable, '-c', IMPORT], cwd=ROOT, env=env, check=True,
+                            stdout=subprocess.PIPE).stdout
+    return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+
+def time_gunicorn(env, workers, preload, port):
+    env = dict(env, WEB_CONCURRENCY=str(workers), WEB_PRELOAD='1' if preload else '0', WEB_WORKER_CLASS='sync')
+    cpu = child_cpu()
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', os.path.join(ROOT, 'gunicorn.conf.py'),
+         '-b', f'127.0.0.1:{port}', 'app:create_app()'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            if process.poll() is not None:
+                raise SystemExit('gunicorn exited during startup')
+            try:
+                urllib.request.urlopen(f'http://127.0.0.1:{port}/login', timeout=1).read()
+                break
+            except (urllib.error.URLError, OSError):
+                time.sleep(0.01)
+        ready = time.perf_counter() - started
+        # let every worker finish booting before counting the CPU they used
+        time.sleep(2)
+    finally:
+        process.terminate()
+        process.wait()
+    return ready, child_cpu() - cpu
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--port', type=int, default=8766)
+    args = parser.parse_args(argv)
+
+    env = dict(os.environ, MAIL_SENDER_THREADS='0')
+    env.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'startup.db'))
+
+    imports = [time_import(env) for _ in range(args.repeat)]
+    print(f'import + create_app: median {statistics.median(i["seconds"] for i in imports) * 1000:.0f}ms, '
+          f'heavy modules loaded: {", ".join(imports[0]["heavy"]) or "none"}')
+
+    for preload in (False, True):
+        runs = [time_gunicorn(env, args.workers, preload, args.port) for _ in range(args.repeat)]
+        print(f'gunicorn {args.workers} workers, preload {"on " if preload else "off"}: '
+              f'first response {statistics.median(r[0] for r in runs) * 1000:.0f}ms, '
+              f'boot CPU {statistics.median(r[1] for r in runs):.2f}s')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
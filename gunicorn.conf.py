@@ -0,0 +1,42 @@
+import os
+import shutil
+import tempfile
+
+# serving profile: sync (one request per worker), gthread (WEB_THREADS per worker) or
+# gevent (up to WEB_WORKER_CONNECTIONS per worker). Keep DB_POOL_SIZE + DB_MAX_OVERFLOW
+# at least as large as the per-worker concurrency, or requests queue for a connection.
+worker_class = os.environ.get('WEB_WORKER_CLASS') or 'sync'
+workers = int(os.environ.get('WEB_CONCURRENCY') or 2)
+# gunicorn silently turns sync workers with threads > 1 into gthread, so only gthread gets threads
+threads = int(os.environ.get('WEB_THREADS') or 8) if worker_class == 'gthread' else 1
+worker_connections = int(os.environ.get('WEB_WORKER_CONNECTIONS') or 100)
+timeout = int(os.environ.get('WEB_TIMEOUT') or 30)
+
+# import the app once in the master and fork the workers from it, so each worker starts
+# warm. Not under gevent: the app's locks and events would predate gevent's patching.
+preload_app = os.environ.get('WEB_PRELOAD', '1') not in ('0', 'false', 'False') and worker_class != 'gevent'
+
+# workers write their metrics to files here and /metrics merges them; it must exist before
+# the app is imported (a preloaded app is imported before on_starting) and is emptied there
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'bookstore-metrics'))
+os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+
+def on_starting(server):
+    directory = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+
+
+def post_fork(server, worker):
+    if worker_class == 'gevent' and (os.environ.get('DATABASE_URL') or '').startswith('postgres'):
+        # psycopg2 blocks in C; make it yield to other greenlets while waiting on the server
+        from psycogreen.gevent import patch_psycopg
+
+        patch_psycopg()
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
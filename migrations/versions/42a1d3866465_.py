@@ -0,0 +1,24 @@
+"""per-user session version, bumped on password change
+
+Revision ID: 42a1d3866465
+Revises: d14de8c7040c
+Create Date: 2026-10-18 12:21:48.660152
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '42a1d3866465'
+down_revision = 'd14de8c7040c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('user', sa.Column('session_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    op.drop_column('user', 'session_version')
@@ -0,0 +1,37 @@
+"""rental rollups for reports
+
+Revision ID: 5b8e2f1c07a4
+Revises: dde8d12cd972
+Create Date: 2026-10-18 15:42:10.518203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b8e2f1c07a4'
+down_revision = 'dde8d12cd972'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('rental_rollup',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('book_type_id', sa.Integer(), nullable=False),
+    sa.Column('author_id', sa.Integer(), nullable=False),
+    sa.Column('customer_id', sa.Integer(), nullable=False),
+    sa.Column('rentals', sa.Integer(), nullable=False),
+    sa.Column('rental_days', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Numeric(precision=12, scale=2), nullable=False),
+    sa.ForeignKeyConstraint(['author_id'], ['author.id'], ),
+    sa.ForeignKeyConstraint(['book_type_id'], ['book_type.id'], ),
+    sa.ForeignKeyConstraint(['customer_id'], ['customer.id'], ),
+    sa.PrimaryKeyConstraint('day', 'book_type_id', 'author_id', 'customer_id')
+    )
+    # existing rentals are rolled up with `flask rebuild-rollups`
+
+
+def downgrade():
+    op.drop_table('rental_rollup')
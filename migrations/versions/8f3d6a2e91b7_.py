@@ -0,0 +1,41 @@
+"""due, returned and overdue timestamps and late fees on rentals
+
+Revision ID: 8f3d6a2e91b7
+Revises: 5b8e2f1c07a4
+Create Date: 2026-10-18 16:27:51.904318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8f3d6a2e91b7'
+down_revision = '5b8e2f1c07a4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('rental', sa.Column('due_at', sa.DateTime(), nullable=True))
+    op.add_column('rental', sa.Column('returned_at', sa.DateTime(), nullable=True))
+    op.add_column('rental', sa.Column('overdue_at', sa.DateTime(), nullable=True))
+    op.add_column('rental', sa.Column('late_fee', sa.Numeric(precision=10, scale=2), nullable=True))
+
+    # rentals before this revision were never tracked: due after `duration` days and taken as returned on time
+    if op.get_bind().dialect.name == 'postgresql':
+        due_at = "created_at + duration * interval '1 day'"
+    else:
+        due_at = "datetime(created_at, '+' || duration || ' days')"
+    op.execute(f'UPDATE rental SET due_at = {due_at}, returned_at = {due_at} WHERE duration IS NOT NULL')
+
+    op.create_index('ix_rental_open_due_at', 'rental', ['due_at', 'id'], unique=False,
+                    postgresql_where=sa.text('returned_at IS NULL'), sqlite_where=sa.text('returned_at IS NULL'))
+
+
+def downgrade():
+    op.drop_index('ix_rental_open_due_at', table_name='rental')
+    op.drop_column('rental', 'late_fee')
+    op.drop_column('rental', 'overdue_at')
+    op.drop_column('rental', 'returned_at')
+    op.drop_column('rental', 'due_at')
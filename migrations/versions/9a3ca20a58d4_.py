@@ -0,0 +1,42 @@
+"""prefix search indexes for the customer, author and book lookups
+
+Revision ID: 9a3ca20a58d4
+Revises: eeab3459ab99
+Create Date: 2026-10-18 10:02:17.884310
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9a3ca20a58d4'
+down_revision = 'eeab3459ab99'
+branch_labels = None
+depends_on = None
+
+# lower(column) LIKE 'prefix%' can only use a btree index built with text_pattern_ops. These are
+# PostgreSQL-only and not on the models; env.py keeps autogenerate from dropping them
+PREFIX_INDEXES = [
+    ('ix_customer_first_name_prefix', 'customer', 'first_name'),
+    ('ix_customer_last_name_prefix', 'customer', 'last_name'),
+    ('ix_customer_email_prefix', 'customer', 'email'),
+    ('ix_author_first_name_prefix', 'author', 'first_name'),
+    ('ix_author_last_name_prefix', 'author', 'last_name'),
+    ('ix_author_email_prefix', 'author', 'email'),
+    ('ix_book_title_prefix', 'book', 'title'),
+]
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for name, table, column in PREFIX_INDEXES:
+        op.create_index(name, table, [sa.text(f'lower({column}) text_pattern_ops')], unique=False)
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for name, table, column in reversed(PREFIX_INDEXES):
+        op.drop_index(name, table_name=table)
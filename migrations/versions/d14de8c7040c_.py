@@ -0,0 +1,41 @@
+"""outbox table for queued emails
+
+Revision ID: d14de8c7040c
+Revises: 9a3ca20a58d4
+Create Date: 2026-10-18 11:40:05.210934
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd14de8c7040c'
+down_revision = '9a3ca20a58d4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('outbox_message',
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('subject', sa.String(length=300), nullable=True),
+    sa.Column('sender', sa.String(length=120), nullable=True),
+    sa.Column('recipients', sa.Text(), nullable=True),
+    sa.Column('text_body', sa.Text(), nullable=True),
+    sa.Column('html_body', sa.Text(), nullable=True),
+    sa.Column('status', sa.String(length=10), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+    sa.Column('last_error', sa.String(length=300), nullable=True),
+    sa.Column('sent_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_outbox_message_due', 'outbox_message', ['status', 'next_attempt_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_outbox_message_due', table_name='outbox_message')
+    op.drop_table('outbox_message')
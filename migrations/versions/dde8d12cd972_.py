@@ -0,0 +1,34 @@
+"""indexes for foreign keys and the ledger query paths
+
+Revision ID: dde8d12cd972
+Revises: 42a1d3866465
+Create Date: 2026-10-18 13:05:33.172840
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'dde8d12cd972'
+down_revision = '42a1d3866465'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(op.f('ix_book_author'), 'book', ['author'], unique=False)
+    op.create_index(op.f('ix_book_book_type'), 'book', ['book_type'], unique=False)
+    op.create_index(op.f('ix_custom_pricing_book_type'), 'custom_pricing', ['book_type'], unique=False)
+    op.create_index(op.f('ix_rental_book_id'), 'rental', ['book_id'], unique=False)
+    op.create_index('ix_rental_customer_id_created_at', 'rental', ['customer_id', 'created_at'], unique=False)
+    op.create_index('ix_rental_created_at', 'rental', ['created_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_rental_created_at', table_name='rental')
+    op.drop_index('ix_rental_customer_id_created_at', table_name='rental')
+    op.drop_index(op.f('ix_rental_book_id'), table_name='rental')
+    op.drop_index(op.f('ix_custom_pricing_book_type'), table_name='custom_pricing')
+    op.drop_index(op.f('ix_book_book_type'), table_name='book')
+    op.drop_index(op.f('ix_book_author'), table_name='book')
@@ -0,0 +1,108 @@
+"""store the rate and total cost on rentals
+
+Revision ID: eeab3459ab99
+Revises: a71b5b7b1fb5
+Create Date: 2026-10-18 09:12:41.503126
+
+"""
+from decimal import Decimal
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'eeab3459ab99'
+down_revision = 'a71b5b7b1fb5'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+CENTS = Decimal('0.01')
+
+book_type = sa.table('book_type', sa.column('id'), sa.column('name'), sa.column('rent_charge'),
+                     sa.column('custom_pricing'))
+custom_pricing = sa.table('custom_pricing', sa.column('id'), sa.column('book_type'),
+                          sa.column('minimum_charge'), sa.column('no_of_days'))
+book = sa.table('book', sa.column('id'), sa.column('book_type'))
+rental = sa.table('rental', sa.column('id'), sa.column('book_id'), sa.column('duration'),
+                  sa.column('unit_price', sa.Numeric(5, 2)), sa.column('total_cost', sa.Numeric(10, 2)))
+
+
+# the pricing rules as of this revision, copied here so later changes to app/pricing.py do not
+# change what the backfill writes. A rule is (included_days, short_rate, short_minimum, base,
+# extra_rate); renting for d days costs
+#   d <= included_days -> max(short_minimum, short_rate * d)
+#   d >  included_days -> base + extra_rate * (d - included_days)
+
+
+def as_decimal(value):
+    return Decimal(str(value or 0))
+
+
+def book_type_rule(name, rate, custom):
+    if custom is not None:
+        minimum_charge = as_decimal(custom.minimum_charge)
+        return custom.no_of_days or 0, Decimal(0), minimum_charge, minimum_charge, rate
+    if name == 'Regular':
+        return 2, Decimal(2), Decimal(0), Decimal(2), Decimal('1.5')
+    if name == 'Novel':
+        return 2, Decimal(0), Decimal('4.5'), rate * 2, rate
+    return 0, rate, Decimal(0), Decimal(0), rate
+
+
+def evaluate(rule, duration):
+    included_days, short_rate, short_minimum, base, extra_rate = rule
+    if duration <= included_days:
+        cost = max(short_minimum, short_rate * duration)
+    else:
+        cost = base + extra_rate * (duration - included_days)
+    return cost.quantize(CENTS)
+
+
+def compile_rules(conn):
+    # only book types flagged custom_pricing use a custom pricing row, the first one added
+    custom = {}
+    for row in conn.execute(sa.select(custom_pricing).order_by(custom_pricing.c.id)):
+        custom.setdefault(row.book_type, row)
+    rules = {}
+    for row in conn.execute(sa.select(book_type)):
+        rate = as_decimal(row.rent_charge)
+        rules[row.id] = (rate, book_type_rule(row.name, rate, custom.get(row.id) if row.custom_pricing else None))
+    return rules
+
+
+def backfill(conn):
+    rules = compile_rules(conn)
+    update = rental.update().where(rental.c.id == sa.bindparam('rental_id')).values(
+        unit_price=sa.bindparam('unit_price'), total_cost=sa.bindparam('total_cost'))
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.select(rental.c.id, rental.c.duration, book.c.book_type)
+            .select_from(rental.join(book, book.c.id == rental.c.book_id))
+            .where(rental.c.id > last_id)
+            .order_by(rental.c.id)
+            .limit(BATCH_SIZE)).fetchall()
+        if not rows:
+            break
+        params = []
+        for row in rows:
+            if row.book_type in rules:
+                rate, rule = rules[row.book_type]
+                params.append({'rental_id': row.id, 'unit_price': rate,
+                               'total_cost': evaluate(rule, row.duration or 0)})
+        if params:
+            conn.execute(update, params)
+        last_id = rows[-1].id
+
+
+def upgrade():
+    op.add_column('rental', sa.Column('unit_price', sa.Numeric(precision=5, scale=2), nullable=True))
+    op.add_column('rental', sa.Column('total_cost', sa.Numeric(precision=10, scale=2), nullable=True))
+    backfill(op.get_bind())
+
+
+def downgrade():
+    op.drop_column('rental', 'total_cost')
+    op.drop_column('rental', 'unit_price')
@@ -1,5 +1,11 @@
+import os
+
 import pytest
-from app import app, db
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from app import create_app, db
+from app.config import Config
 from app.models import Author, Book, User, Customer, Rental, BookType
 
 
@@ -9,14 +15,24 @@ def new_user():
     return user
 
 
-@pytest.fixture(scope='module')
-def test_client():
-    flask_app = app('flask_test.cfg')
+class TestConfig(Config):
+    TESTING = True
+    WTF_CSRF_ENABLED = False
+    # every request would start sender threads; tests drain the outbox themselves
+    MAIL_SENDER_THREADS = 0
+
 
+@pytest.fixture(scope='session')
+def test_app():
+    return create_app(TestConfig)
+
+
+@pytest.fixture(scope='module')
+def test_client(test_app):
     # Create a test client using the Flask application configured for testing
-    with flask_app.test_client() as testing_client:
+    with test_app.test_client() as testing_client:
         # Establish an application context
-        with flask_app.app_context():
+        with test_app.app_context():
             yield testing_client  # this is where the testing happens!
 
 
@@ -30,7 +46,7 @@ def init_database(test_client):
     u1.set_password('Toor')
     u2 = User(username='kennyg', email='kennyg@gmail.com')
     u2.set_password('PaSsWoRd')
-    db.session.add([u1, u2])
+    db.session.add_all([u1, u2])
 
     # Commit the changes for the users
     db.session.commit()
@@ -38,23 +54,24 @@ def init_database(test_client):
     # Insert author data
     a1 = Author(first_name='Pat', last_name='Dee', email='patd@gmail.com')
     a2 = Author(first_name='Kenny', last_name='Gee', email='kennyg@gmail.com')
-    db.session.add([a1, a2])
+    db.session.add_all([a1, a2])
 
     # Insert book type data
     bt1 = BookType(name='Regular', rent_charge='1.5')
     bt2 = BookType(name='Fiction', rent_charge='3.0')
     bt3 = BookType(name='Novel', rent_charge='1.5')
-    db.session.add([bt1, bt2, bt3])
+    db.session.add_all([bt1, bt2, bt3])
 
     # Insert book data
-    b1 = Book(title='The River Between', book_type=bt1, author=a1)
-    b2 = Book(title='The Man in the Mask', book_type=bt2, author=a2)
-    db.session.add([b1, b2])
+    b1 = Book(title='The River Between', type=bt1, writer=a1)
+    b2 = Book(title='The Man in the Mask', type=bt2, writer=a2)
+    db.session.add_all([b1, b2])
 
     # Insert customer data
     c1 = Customer(first_name='Jane', last_name='Doe', email='jane.doe@gmail.com')
     c2 = Customer(first_name='Jude', last_name='Law', email='jude.law@gmail.com')
-    db.session.add([c1, c2])
+    db.session.add_all([c1, c2])
+    db.session.commit()
 
     yield  # this is where the testing happens!
 
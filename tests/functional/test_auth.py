@@ -0,0 +1,63 @@
+from flask import current_app
+
+from app import cache, db
+from app.models import User
+from tests.functional.test_ledger import count_queries
+
+
+def login(client, username, password):
+    return client.post('/login', data=dict(username=username, password=password))
+
+
+def test_authenticated_requests_skip_user_lookup(test_client, init_database, login_default_user):
+    """
+    after the first request the logged in user comes from the cache
+    """
+    assert test_client.get('/api/cache/stats').status_code == 200
+    db.session.expire_all()
+    queries = count_queries(lambda: test_client.get('/api/cache/stats'))
+    assert queries == 0
+
+
+def test_password_change_signs_out_other_sessions(test_client, init_database):
+    """
+    changing the password bumps the session version so older sessions stop working
+    """
+    other = current_app.test_client()
+    assert login(other, 'kennyg', 'PaSsWoRd').status_code == 302
+    assert other.get('/api/cache/stats').status_code == 200
+
+    user = User.query.filter_by(username='kennyg').first()
+    token = user.get_reset_password_token()
+    with current_app.test_client() as anonymous:
+        response = anonymous.post(f'/reset_password/{token}', data=dict(password='NewPass', password2='NewPass'))
+        assert response.status_code == 302
+
+    assert other.get('/api/cache/stats').status_code == 302
+    assert login(other, 'kennyg', 'NewPass').status_code == 302
+    assert other.get('/api/cache/stats').status_code == 200
+    other.get('/logout')
+    assert other.get('/api/cache/stats').status_code == 302
+
+
+def test_remember_me_survives_the_session(test_client, init_database):
+    """
+    a remember-me cookie logs the user back in once the session cookie is gone, until the password changes
+    """
+    client = current_app.test_client()
+    client.post('/login', data=dict(username='patd', password='Toor'))
+    client.delete_cookie('localhost', 'session')
+    assert client.get('/books').status_code == 302
+
+    client.post('/login', data=dict(username='patd', password='Toor', remember_me='y'))
+    client.delete_cookie('localhost', 'session')
+    assert client.get('/books').status_code == 200
+
+    user = User.query.filter_by(username='patd').first()
+    user.set_password('Toor')
+    db.session.commit()
+    cache.users.invalidate(user.id)
+    client.delete_cookie('localhost', 'session')
+    assert client.get('/books').status_code == 302
+    # the next module recreates patd with a lower session version
+    cache.users.invalidate(user.id)
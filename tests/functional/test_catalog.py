@@ -0,0 +1,79 @@
+import io
+
+from flask import current_app
+
+from app.catalog import CatalogImport
+from app.models import Author, Book, BookType
+
+CATALOG = '''title,book_type,rent_charge,author_first_name,author_last_name,author_email
+Weep Not Child,Regular,,Ngugi,wa Thiongo,ngugi@example.com
+Petals of Blood,Regular,,Ngugi,wa Thiongo,ngugi@example.com
+Things Fall Apart,Classic,2.75,Chinua,Achebe,achebe@example.com
+,Regular,,Nobody,,nobody@example.com
+Arrow of God,Classic,,Chinua,Achebe,achebe@example.com
+The Wizard of the Crow,Poetry,,Ngugi,wa Thiongo,ngugi@example.com
+Another River,Regular,,Someone,Else,patd@gmail.com
+'''
+
+
+def test_import_catalog_upload(test_client, init_database, login_default_user):
+    """
+    authors are deduplicated by email against the file and the database, new book types are
+    created, and bad rows are reported by line without stopping their batch
+    """
+    authors = Author.query.count()
+    response = test_client.post('/api/catalog/import', content_type='multipart/form-data',
+                                data={'file': (io.BytesIO(CATALOG.encode('utf-8-sig')), 'catalog.csv')})
+    assert response.status_code == 200
+    report = response.get_json()
+    assert (report['rows'], report['books'], report['authors'], report['book_types'], report['errors']) == \
+        (7, 5, 2, 1, 2)
+    assert [e['line'] for e in report['batches'][0]['errors']] == [5, 7]
+    assert Author.query.count() == authors + 2
+
+    classic = BookType.query.filter_by(name='Classic').one()
+    assert str(classic.rent_charge) == '2.75'
+    achebe = Author.query.filter_by(email='achebe@example.com').one()
+    assert {b.title for b in Book.query.filter_by(author=achebe.id)} == {'Things Fall Apart', 'Arrow of God'}
+    existing = Author.query.filter_by(email='patd@gmail.com').one()
+    assert Book.query.filter_by(title='Another River').one().author == existing.id
+
+
+def test_import_catalog_command_batches(test_client, init_database, tmp_path):
+    """
+    flask import-catalog commits batch by batch and reports each one
+    """
+    books = Book.query.count()
+    path = tmp_path / 'catalog.csv'
+    path.write_text('title,book_type,author_email\n' + ''.join(
+        f'Book {i},Regular,author{i % 7}@batch.example.com\n' for i in range(25)))
+    result = current_app.test_cli_runner().invoke(args=['import-catalog', str(path), '--batch-size', '10'])
+    assert result.exit_code == 0, result.output
+    assert 'batch 3 (lines 22-26): 5 books, 0 new authors, 0 errors' in result.output
+    assert 'Imported 25 books, 7 authors' in result.output
+    assert Book.query.count() == books + 25
+
+    path.write_text('name,email\nx,y\n')
+    result = current_app.test_cli_runner().invoke(args=['import-catalog', str(path)])
+    assert result.exit_code != 0
+    assert 'missing title, book_type, author_email' in result.output
+
+
+def test_import_catalog_rejects_bad_upload(test_client, init_database, login_default_user):
+    response = test_client.post('/api/catalog/import', data='just,some\ncolumns,here\n', content_type='text/csv')
+    assert response.status_code == 400
+
+
+def test_import_catalog_rejects_long_book_type_names(test_client, init_database):
+    """
+    a book type name that does not fit BookType.name is a row error, so importing the file again
+    cannot create another copy of a truncated type
+    """
+    book_types = BookType.query.count()
+    catalog = 'title,book_type,rent_charge,author_email\n' \
+              'Long Type,Illustrated Collectors Editions,4.00,long@example.com\n'
+    for _ in range(2):
+        report = CatalogImport().run(io.StringIO(catalog))
+        assert (report['books'], report['book_types'], report['errors']) == (0, 0, 1)
+        assert 'longer than 30 characters' in report['batches'][0]['errors'][0]['error']
+    assert BookType.query.count() == book_types
@@ -0,0 +1,113 @@
+from flask import current_app, template_rendered
+
+from app import db, pdf
+from app.models import Book, Customer, Rental
+
+
+def rendered_templates(callback):
+    names = []
+
+    def record(sender, template, context, **extra):
+        names.append(template.name)
+
+    template_rendered.connect(record, current_app._get_current_object())
+    try:
+        response = callback()
+    finally:
+        template_rendered.disconnect(record, current_app._get_current_object())
+    return response, names
+
+
+def test_list_page_not_modified(test_client, init_database, login_default_user):
+    """
+    a list page answers 304 without rendering until a row is added or changed
+    """
+    first = test_client.get('/customers')
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+    assert first.headers['Last-Modified']
+    assert 'no-cache' in first.headers['Cache-Control']
+
+    response, templates = rendered_templates(
+        lambda: test_client.get('/customers', headers={'If-None-Match': etag}))
+    assert response.status_code == 304
+    assert templates == []
+
+    customer = Customer(first_name='Ann', last_name='Other', email='ann.other@gmail.com')
+    db.session.add(customer)
+    db.session.commit()
+    added = test_client.get('/customers', headers={'If-None-Match': etag})
+    assert added.status_code == 200
+    assert added.headers['ETag'] != etag
+
+    customer.last_name = 'Changed'
+    db.session.commit()
+    changed = test_client.get('/customers', headers={'If-None-Match': added.headers['ETag']})
+    assert changed.status_code == 200
+    # another page of the same table is a different representation
+    assert test_client.get('/customers?per_page=1').headers['ETag'] != changed.headers['ETag']
+
+
+def test_statement_not_modified(test_client, init_database, login_default_user, tmp_path, monkeypatch):
+    """
+    statements and their PDFs answer 304 without rendering until the rental or what it shows changes
+    """
+    monkeypatch.setitem(current_app.config, 'PDF_CACHE_DIR', str(tmp_path))
+    rental = Rental(customer=Customer.query.first(), book=Book.query.first(), duration=2)
+    db.session.add(rental)
+    db.session.commit()
+
+    view = test_client.get(f'/view/statement/{rental.id}')
+    printed = test_client.get(f'/print/statement/{rental.id}')
+    assert printed.status_code == 200
+
+    monkeypatch.setattr(pdf, 'render', None)
+    response, templates = rendered_templates(
+        lambda: test_client.get(f'/view/statement/{rental.id}', headers={'If-None-Match': view.headers['ETag']}))
+    assert response.status_code == 304
+    assert templates == []
+    again = test_client.get(f'/print/statement/{rental.id}', headers={'If-None-Match': printed.headers['ETag']})
+    assert again.status_code == 304
+    assert again.data == b''
+
+    # another customer's change leaves this statement alone, its own customer's does not
+    Customer.query.filter(Customer.id != rental.customer_id).first().first_name = 'Someone'
+    db.session.commit()
+    headers = {'If-None-Match': view.headers['ETag']}
+    assert test_client.get(f'/view/statement/{rental.id}', headers=headers).status_code == 304
+    rental.customer.first_name = 'Janet'
+    db.session.commit()
+    assert test_client.get(f'/view/statement/{rental.id}', headers=headers).status_code == 200
+
+
+def test_list_validators_cover_only_the_page(test_client, init_database, login_default_user):
+    """
+    the ETag of a list page follows the rows on it and what they show, not the whole table
+    """
+    customer = Customer.query.first()
+    books = Book.query.all()
+    db.session.add_all([Rental(customer=customer, book=books[i % 2], duration=1) for i in range(4)])
+    db.session.commit()
+    first, *rest = Rental.query.order_by(Rental.id).all()
+
+    page = test_client.get('/home?per_page=2')
+    headers = {'If-None-Match': page.headers['ETag']}
+    assert test_client.get('/home?per_page=2', headers=headers).status_code == 304
+
+    # a rental beyond the next page's first row changes nothing on this page
+    rest[-1].duration = 5
+    db.session.commit()
+    assert test_client.get('/home?per_page=2', headers=headers).status_code == 304
+
+    # the author of a book on the page does
+    first.book.writer.first_name = 'Patrick'
+    db.session.commit()
+    assert test_client.get('/home?per_page=2', headers=headers).status_code == 200
+
+    # and so does a row on the page going away
+    page = test_client.get('/home?per_page=2')
+    db.session.delete(rest[0])
+    db.session.commit()
+    assert test_client.get('/home?per_page=2', headers={'If-None-Match': page.headers['ETag']}).status_code == 200
+    first.book.writer.first_name = 'Pat'
+    db.session.commit()
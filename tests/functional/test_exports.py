@@ -0,0 +1,39 @@
+import csv
+import io
+import json
+from datetime import datetime
+
+from app import db
+from app.models import Book, Customer, Rental
+
+
+def test_export_rentals_csv_and_ndjson(test_client, init_database, login_default_user):
+    """
+    the ledger export streams every rental in the requested date range
+    """
+    customer = Customer.query.first()
+    book = Book.query.first()
+    db.session.add_all([Rental(customer=customer, book=book, duration=2, created_at=datetime(2020, 1, day))
+                        for day in (1, 2, 3)])
+    db.session.commit()
+
+    response = test_client.get('/export/rentals.csv?from=2020-01-02&to=2020-01-03')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/csv'
+    rows = list(csv.DictReader(io.StringIO(response.data.decode())))
+    assert [r['rented_at'][:10] for r in rows] == ['2020-01-02', '2020-01-03']
+    assert rows[0]['title'] == book.title
+    assert rows[0]['total_cost']
+
+    response = test_client.get('/export/rentals.ndjson?to=2020-01-01')
+    rows = [json.loads(line) for line in response.data.decode().splitlines()]
+    assert len(rows) == 1
+    assert rows[0]['customer'] == f'{customer.first_name} {customer.last_name}'
+
+
+def test_export_rejects_bad_input(test_client, init_database, login_default_user):
+    """
+    unknown formats and malformed dates are refused
+    """
+    assert test_client.get('/export/rentals.xml').status_code == 404
+    assert test_client.get('/export/rentals.csv?from=yesterday').status_code == 400
@@ -0,0 +1,36 @@
+from app import cache, db
+from app.models import Book, Customer, Rental
+
+
+def test_rows_served_from_fragment_cache(test_client, init_database, login_default_user):
+    """
+    unchanged ledger rows come from the fragment cache, edited ones are rendered again
+    """
+    rental = Rental(customer=Customer.query.first(), book=Book.query.first(), duration=2)
+    db.session.add(rental)
+    db.session.commit()
+    rows = Rental.query.count()
+
+    test_client.get('/home')
+    before = cache.fragments.stats()
+    assert test_client.get('/home').status_code == 200
+    after = cache.fragments.stats()
+    assert after['hits'] - before['hits'] == rows
+    assert after['misses'] == before['misses']
+
+    rental.customer.first_name = 'Janet'
+    db.session.commit()
+    response = test_client.get('/home')
+    assert b'Janet' in response.data
+    assert cache.fragments.stats()['misses'] > after['misses']
+
+
+def test_book_rows_follow_edits(test_client, init_database, login_default_user):
+    """
+    a renamed book shows its new title although its row was cached
+    """
+    test_client.get('/books')
+    book = Book.query.first()
+    book.title = 'Petals of Blood'
+    db.session.commit()
+    assert b'Petals of Blood' in test_client.get('/books').data
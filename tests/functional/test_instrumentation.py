@@ -0,0 +1,30 @@
+import json
+import logging
+
+from flask import current_app
+
+
+def test_server_timing_header(test_client, init_database, login_default_user):
+    """
+    every response reports its SQL time and query count
+    """
+    response = test_client.get('/customers')
+    timings = response.headers.get_all('Server-Timing')
+    assert timings[0].startswith('db;dur=')
+    assert 'queries"' in timings[0]
+    assert timings[1].startswith('app;dur=')
+
+
+def test_slow_queries_are_logged_with_template(test_client, init_database, login_default_user, monkeypatch,
+                                               caplog):
+    """
+    a query over SQL_SLOW_QUERY_MS is logged with the route and the template being rendered
+    """
+    monkeypatch.setitem(current_app.config, 'SQL_SLOW_QUERY_MS', 0)
+    with caplog.at_level(logging.INFO, logger=current_app.logger.name):
+        test_client.get('/books')
+    events = [json.loads(r.getMessage()) for r in caplog.records if r.getMessage().startswith('{')]
+    slow = [e for e in events if e['event'] == 'slow_query']
+    assert slow and all(e['endpoint'] == 'main.get_books' for e in slow)
+    [summary] = [e for e in events if e['event'] == 'request']
+    assert summary['queries'] == len(slow)
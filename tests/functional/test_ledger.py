@@ -0,0 +1,47 @@
+from sqlalchemy import event
+
+from app import db
+from app.models import Book, Customer, Rental
+
+
+def count_queries(callback):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        callback()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    return len(statements)
+
+
+def add_rentals(n):
+    customers = Customer.query.all()
+    books = Book.query.all()
+    for i in range(n):
+        db.session.add(Rental(customer=customers[i % len(customers)], book=books[i % len(books)], duration=i % 5 + 1))
+    db.session.commit()
+
+
+def test_home_page_query_count(test_client, init_database, login_default_user):
+    """
+    the rental ledger costs the same number of queries regardless of row count
+    """
+    def get_home():
+        db.session.expire_all()
+        test_client.get('/home')
+
+    add_rentals(2)
+    get_home()
+    few = count_queries(get_home)
+
+    add_rentals(50)
+    many = count_queries(get_home)
+
+    response = test_client.get('/home')
+    assert response.status_code == 200
+    assert b'The River Between' in response.data
+    assert many == few
@@ -0,0 +1,50 @@
+from concurrent.futures import Future
+
+from flask import current_app
+
+from app import metrics
+
+
+def sample(body, line):
+    return any(l.startswith(line) for l in body.splitlines())
+
+
+def test_metrics_report_routes_pool_and_queue(test_client, init_database, login_default_user):
+    """
+    /metrics exposes request latency and status counts, pool checkouts and the email queue depth
+    """
+    test_client.get('/customers')
+    response = test_client.get('/metrics')
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain')
+    body = response.get_data(as_text=True)
+    assert sample(body, 'bookstore_requests_total{endpoint="main.get_customers",method="GET",status="200"}')
+    assert sample(body, 'bookstore_request_duration_seconds_count{endpoint="main.get_customers",method="GET"}')
+    assert sample(body, 'bookstore_db_pool_checkouts_total{bind="default"}')
+    assert sample(body, 'bookstore_email_queue_depth ')
+
+
+def test_metrics_token(test_client, init_database, monkeypatch):
+    """
+    with METRICS_TOKEN set, scrapes need the bearer token
+    """
+    monkeypatch.setitem(current_app.config, 'METRICS_TOKEN', 's3cret')
+    assert test_client.get('/metrics').status_code == 403
+    assert test_client.get('/metrics', headers={'Authorization': 'Bearer s3cret'}).status_code == 200
+
+
+def test_pdf_render_durations(test_client, init_database):
+    """
+    finished renders feed the duration histogram and failed ones the failure counter
+    """
+    def count(name):
+        return metrics.REGISTRY.get_sample_value(name) or 0
+
+    renders, failures = count('bookstore_pdf_render_seconds_count'), count('bookstore_pdf_render_failures_total')
+    done, failed = Future(), Future()
+    done.set_result(0.4)
+    failed.set_exception(OSError('no cairo'))
+    metrics.observe_render(done)
+    metrics.observe_render(failed)
+    assert count('bookstore_pdf_render_seconds_count') == renders + 1
+    assert count('bookstore_pdf_render_failures_total') == failures + 1
@@ -0,0 +1,123 @@
+import smtplib
+
+import pytest
+
+from flask import current_app
+from flask_mail import Message
+
+from app import db, mail
+from app.email import send_email
+from app.models import OutboxMessage
+from app import outbox as outbox_module
+from app.outbox import outbox
+
+
+@pytest.fixture(scope='function')
+def quiet_outbox(monkeypatch):
+    # no sender threads and no real SMTP server: the test drains the outbox itself
+    monkeypatch.setitem(current_app.config, 'MAIL_SENDER_THREADS', 0)
+    monkeypatch.setattr(current_app.extensions['mail'], 'suppress', True)
+    yield outbox
+
+
+def test_outbox_sends_queued_email(test_client, init_database, quiet_outbox):
+    """
+    queued emails are stored, then sent in one batch
+    """
+    for i in range(3):
+        send_email(f'Hello {i}', sender='no-reply@example.com', recipients=['jane.doe@gmail.com'],
+                   text_body='hi', html_body='<p>hi</p>')
+    assert quiet_outbox.depth() == 3
+
+    with mail.record_messages() as sent:
+        assert quiet_outbox.drain() == 3
+    assert [m.subject for m in sent] == ['Hello 0', 'Hello 1', 'Hello 2']
+    assert quiet_outbox.depth() == 0
+    assert OutboxMessage.query.filter_by(status='sent').count() == 3
+
+
+def test_outbox_retries_with_backoff(test_client, init_database, quiet_outbox, monkeypatch):
+    """
+    a failed send is retried later and given up after MAIL_MAX_ATTEMPTS
+    """
+    def refuse():
+        raise smtplib.SMTPConnectError(421, 'try later')
+
+    monkeypatch.setattr(mail, 'connect', refuse)
+    monkeypatch.setitem(current_app.config, 'MAIL_MAX_ATTEMPTS', 2)
+    monkeypatch.setitem(current_app.config, 'MAIL_RETRY_BACKOFF', 0)
+    send_email('Retry', sender='no-reply@example.com', recipients=['jane.doe@gmail.com'],
+                         text_body='hi', html_body='<p>hi</p>')
+
+    message = OutboxMessage.query.filter_by(subject='Retry').first()
+    assert quiet_outbox.drain() == 2
+    assert message.status == 'failed'
+    assert message.attempts == 2
+    assert 'try later' in message.last_error
+
+
+def test_outbox_sends_pending_email_on_first_request(test_client, init_database, quiet_outbox, monkeypatch):
+    """
+    messages left pending by an earlier process go out once the app serves a request, without a new enqueue
+    """
+    class Stop(Exception):
+        pass
+
+    class InlineThread(object):
+        # the in-memory test database lives on one connection, so the sender runs on this thread
+        # until its first idle wait
+        def __init__(self, target, **kwargs):
+            self.target = target
+
+        def start(self):
+            with pytest.raises(Stop):
+                self.target()
+
+        def is_alive(self):
+            return False
+
+    def stop(timeout):
+        raise Stop()
+
+    db.session.add_all([OutboxMessage(subject=f'Left over {i}', sender='no-reply@example.com',
+                                      recipients='jane.doe@gmail.com', text_body='hi', html_body='<p>hi</p>')
+                        for i in range(2)])
+    db.session.commit()
+    monkeypatch.setitem(current_app.config, 'MAIL_SENDER_THREADS', 1)
+    monkeypatch.setattr(outbox_module.threading, 'Thread', InlineThread)
+    monkeypatch.setattr(quiet_outbox._wake, 'wait', stop)
+    # as in a freshly forked worker
+    monkeypatch.setattr(quiet_outbox, '_pid', None)
+    monkeypatch.setattr(quiet_outbox, '_threads', [])
+
+    with mail.record_messages() as sent:
+        test_client.get('/login')
+    assert [m.subject for m in sent] == ['Left over 0', 'Left over 1']
+    assert quiet_outbox.depth() == 0
+
+
+def test_outbox_fails_one_message_without_resending_the_batch(test_client, init_database, quiet_outbox,
+                                                               monkeypatch):
+    """
+    a message that raises something other than an SMTP error is failed on its own; the rest of its batch
+    is still recorded as sent
+    """
+    def build(subject, **kwargs):
+        if subject == 'Broken':
+            raise UnicodeEncodeError('ascii', subject, 0, 1, 'not ascii')
+        return Message(subject, **kwargs)
+
+    monkeypatch.setattr(outbox_module, 'Message', build)
+    monkeypatch.setitem(current_app.config, 'MAIL_MAX_ATTEMPTS', 1)
+    for subject in ('Before', 'Broken', 'After'):
+        send_email(subject, sender='no-reply@example.com', recipients=['jane.doe@gmail.com'],
+                   text_body='hi', html_body='<p>hi</p>')
+
+    with mail.record_messages() as sent:
+        assert quiet_outbox.drain() == 3
+        assert quiet_outbox.drain() == 0
+    assert [m.subject for m in sent] == ['Before', 'After']
+    statuses = {m.subject: m.status for m in OutboxMessage.query.filter(
+        OutboxMessage.subject.in_(['Before', 'Broken', 'After']))}
+    assert statuses == {'Before': 'sent', 'Broken': 'failed', 'After': 'sent'}
+    assert 'not ascii' in OutboxMessage.query.filter_by(subject='Broken').one().last_error
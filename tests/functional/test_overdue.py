@@ -0,0 +1,115 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from flask import current_app
+from sqlalchemy import func
+
+from app import db
+from app.models import Book, Customer, Rental, RentalRollup
+from app.overdue import sweep
+from app.pricing import pricing
+from tests.functional.test_ledger import count_queries
+
+
+def rent(days_ago, duration, book=None, returned=False):
+    now = datetime.utcnow()
+    rental = Rental(customer=Customer.query.first(), book=book or Book.query.first(), duration=duration,
+                    created_at=now - timedelta(days=days_ago))
+    rental.unit_price = pricing.rate(rental.book.book_type)
+    rental.total_cost = pricing.cost(rental.book.book_type, duration)
+    if returned:
+        rental.returned_at = now
+    db.session.add(rental)
+    db.session.commit()
+    return rental
+
+
+def test_rentals_are_due_after_their_duration(test_client, init_database, login_default_user):
+    customer = Customer.query.first()
+    book = Book.query.first()
+    response = test_client.post('/api/rentals', json={'rentals': [
+        {'customer_id': customer.id, 'book_ids': [book.id], 'duration': 3}]})
+    assert response.status_code == 201
+    rental = Rental.query.order_by(Rental.id.desc()).first()
+    assert rental.due_at == rental.created_at + timedelta(days=3)
+    assert rent(0, 5).due_at.date() == (datetime.utcnow() + timedelta(days=5)).date()
+
+
+def test_sweep_prices_late_fees_in_batches(test_client, init_database):
+    """
+    the sweep flags open overdue rentals, charges every started day late at today's rate and
+    costs the same number of statements per batch however many rentals it covers
+    """
+    regular, fiction = Book.query.order_by(Book.id).all()
+    late = [rent(10, 2, regular) for _ in range(3)] + [rent(10, 7, fiction)]
+    returned = rent(10, 2, regular, returned=True)
+    now = datetime.utcnow()
+
+    statements = count_queries(lambda: sweep(now, batch_size=100))
+    assert all(r.overdue_at is not None for r in late)
+    assert returned.overdue_at is None and returned.late_fee is None
+    assert late[0].late_fee == Decimal('12.00')  # 8 days at 1.5
+    assert late[3].late_fee == Decimal('9.00')  # 3 days at 3.0
+
+    for _ in range(10):
+        rent(10, 2, regular)
+    assert count_queries(lambda: sweep(now, batch_size=100)) == statements
+
+    swept, flagged, charged = sweep(now + timedelta(days=1), batch_size=3)
+    assert (swept, flagged) == (14, 0)
+    assert charged == 13 * Decimal('1.5') + Decimal('3.0')
+
+    revenue = db.session.query(func.sum(RentalRollup.revenue)).scalar()
+    assert revenue == sum(r.total_cost + (r.late_fee or 0) for r in Rental.query)
+
+
+def test_return_workflow(test_client, init_database, login_default_user):
+    rental = rent(5, 3)
+    response = test_client.get(f'/return/rental/{rental.id}')
+    assert response.status_code == 200
+    assert b'Late fee if returned now: $3.00' in response.data
+
+    response = test_client.post(f'/return/rental/{rental.id}', follow_redirects=True)
+    assert b'has been returned with a $3.00 late fee' in response.data
+    db.session.refresh(rental)
+    assert rental.returned_at is not None
+    assert not rental.is_overdue()
+
+    response = test_client.post(f'/return/rental/{rental.id}', follow_redirects=True)
+    assert b'was already returned' in response.data
+
+    on_time = rent(0, 3)
+    test_client.post(f'/return/rental/{on_time.id}')
+    db.session.refresh(on_time)
+    assert on_time.returned_at is not None and on_time.late_fee is None
+
+
+def test_sweep_overdue_command(test_client, init_database):
+    rent(4, 1)
+    result = current_app.test_cli_runner().invoke(args=['sweep-overdue', '--batch-size', '2'])
+    assert result.exit_code == 0
+    assert '1 newly flagged' in result.output
+
+
+def test_sweep_skips_rentals_returned_mid_batch(test_client, init_database, monkeypatch):
+    """
+    a rental returned after the sweep read its batch keeps the return's fee, counted once in the rollups
+    """
+    sweep()
+    rental = rent(6, 2)
+    check = pricing.check
+
+    def return_meanwhile():
+        # what return_book does in another request, after the batch was read
+        monkeypatch.setattr(pricing, 'check', check)
+        rental.return_book()
+        db.session.flush()
+        check()
+    monkeypatch.setattr(pricing, 'check', return_meanwhile)
+
+    swept, flagged, charged = sweep()
+    assert (flagged, charged) == (0, 0)
+    db.session.refresh(rental)
+    assert rental.overdue_at is None and rental.late_fee == Decimal('6.00')
+    revenue = db.session.query(func.sum(RentalRollup.revenue)).scalar()
+    assert revenue == sum(r.total_cost + (r.late_fee or 0) for r in Rental.query)
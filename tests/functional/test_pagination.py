@@ -0,0 +1,47 @@
+import re
+
+from flask import current_app
+
+from app import db
+from app.models import Customer
+
+
+def row_ids(response):
+    return [int(i) for i in re.findall(rb'<tr>\s*<td>(\d+)</td>', response.data)]
+
+
+def test_customers_keyset_pages(test_client, init_database, login_default_user):
+    """
+    walking next/prev cursors visits every customer exactly once
+    """
+    db.session.add_all([Customer(first_name='Page', last_name=str(i), email=f'page{i}@example.com')
+                        for i in range(25)])
+    db.session.commit()
+    ids = [c.id for c in Customer.query.order_by(Customer.id)]
+
+    seen = []
+    url = '/customers?per_page=10'
+    while url:
+        response = test_client.get(url)
+        assert response.status_code == 200
+        seen.extend(row_ids(response))
+        marker = b'<li class="next"><a href="'
+        if marker in response.data:
+            url = response.data.split(marker)[1].split(b'"')[0].decode().replace('&amp;', '&')
+        else:
+            url = None
+    assert seen == ids
+
+    response = test_client.get(f'/customers?per_page=10&before={ids[10]}')
+    assert row_ids(response) == ids[:10]
+    assert b'class="previous"' not in response.data
+
+
+def test_per_page_is_capped(test_client, init_database, login_default_user):
+    """
+    per_page cannot exceed MAX_PER_PAGE
+    """
+    from app.pagination import KeysetPage
+
+    page = KeysetPage(Customer.query, Customer.id, per_page=10 ** 6)
+    assert page.per_page == current_app.config['MAX_PER_PAGE']
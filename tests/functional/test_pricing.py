@@ -0,0 +1,124 @@
+import pytest
+
+from app import db
+from app.models import Book, BookType, CustomPricing
+from app.pricing import UnknownBookType, pricing
+from tests.functional.test_ledger import count_queries
+
+
+def test_pricing_table_is_cached(test_client, init_database):
+    """
+    pricing a batch of rentals does not touch the database once compiled
+    """
+    types = BookType.query.all()
+    pricing.invalidate()
+    pricing.rules
+    items = [(types[i % len(types)].id, i % 7 + 1) for i in range(500)]
+    costs = []
+    assert count_queries(lambda: costs.extend(pricing.price_many(items))) == 0
+    assert len(costs) == 500
+
+
+def test_custom_pricing_invalidates(test_client, init_database, login_default_user):
+    """
+    adding custom pricing through the route is picked up on the next quote
+    """
+    fiction = BookType.query.filter_by(name='Fiction').first()
+    fiction.custom_pricing = True
+    db.session.commit()
+    assert pricing.cost(fiction.id, 1) == 3
+    test_client.post(f'/add/custom/pricing/{fiction.id}',
+                     data=dict(minimum_charge='5', no_of_days='2'))
+    assert CustomPricing.query.filter_by(book_type=fiction.id).count() == 1
+    assert pricing.cost(fiction.id, 1) == 5
+    assert pricing.cost(fiction.id, 3) == 8
+
+    # a second row is refused, and the flag switches the custom rule off again
+    response = test_client.post(f'/add/custom/pricing/{fiction.id}', data=dict(minimum_charge='9', no_of_days='2'))
+    assert response.status_code == 302
+    assert CustomPricing.query.filter_by(book_type=fiction.id).count() == 1
+    fiction.custom_pricing = False
+    db.session.commit()
+    pricing.check()
+    assert pricing.cost(fiction.id, 1) == 3
+    db.session.delete(CustomPricing.query.filter_by(book_type=fiction.id).first())
+    db.session.commit()
+    pricing.invalidate()
+
+
+def test_custom_pricing_first_row_wins(test_client, init_database):
+    """
+    of several custom pricing rows for one book type the first one added applies
+    """
+    fiction = BookType.query.filter_by(name='Fiction').first()
+    fiction.custom_pricing = True
+    db.session.add_all([CustomPricing(book_type=fiction.id, minimum_charge=5, no_of_days=2),
+                        CustomPricing(book_type=fiction.id, minimum_charge=9, no_of_days=2)])
+    db.session.commit()
+    pricing.invalidate()
+    assert pricing.cost(fiction.id, 1) == 5
+    CustomPricing.query.filter_by(book_type=fiction.id).delete()
+    fiction.custom_pricing = False
+    db.session.commit()
+    pricing.invalidate()
+
+
+def test_unknown_book_types_are_not_priced(test_client, init_database, login_default_user):
+    """
+    a book with no book type, or one that does not exist, is a client error and does not recompile the table
+    """
+    def untyped():
+        with pytest.raises(UnknownBookType):
+            pricing.cost(None, 1)
+
+    pricing.rules
+    assert count_queries(untyped) == 0
+    with pytest.raises(UnknownBookType):
+        pricing.cost(9999, 1)
+
+    book = Book(title='Untyped')
+    db.session.add(book)
+    db.session.commit()
+    response = test_client.post('/api/quote', json={'book_ids': [book.id], 'durations': [1]})
+    assert response.status_code == 400
+    assert 'no pricing' in response.get_json()['error']
+    db.session.delete(book)
+    db.session.commit()
+
+
+def test_quote_matches_cost(test_client, init_database):
+    """
+    the vectorised quote agrees with pricing.cost for every rule kind, including custom pricing
+    """
+    types = BookType.query.all()
+    types[0].custom_pricing = True
+    db.session.add(CustomPricing(book_type=types[0].id, minimum_charge=4.5, no_of_days=3))
+    db.session.commit()
+    pricing.invalidate()
+    ids = [bt.id for bt in types] * 2
+    durations = list(range(1, 20))
+    assert pricing.quote(ids, durations).tolist() == \
+        [[int(pricing.cost(b, d) * 100) for d in durations] for b in ids]
+    db.session.delete(CustomPricing.query.filter_by(book_type=types[0].id).first())
+    types[0].custom_pricing = False
+    db.session.commit()
+    pricing.invalidate()
+
+
+def test_quote_api(test_client, init_database, login_default_user):
+    """
+    /api/quote prices every book against every duration in one call, with a cart total per duration
+    """
+    river, mask = Book.query.order_by(Book.id).all()
+    response = test_client.post('/api/quote', json={'book_ids': [river.id, mask.id], 'durations': [1, 3]})
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['quotes'] == [
+        {'book_id': river.id, 'costs': [str(pricing.cost(river.book_type, 1)), str(pricing.cost(river.book_type, 3))]},
+        {'book_id': mask.id, 'costs': ['3.00', '9.00']},
+    ]
+    assert data['totals'] == [str(pricing.cost(river.book_type, 1) + 3), str(pricing.cost(river.book_type, 3) + 9)]
+
+    assert test_client.post('/api/quote', json={'book_ids': [999], 'durations': [1]}).status_code == 400
+    assert test_client.post('/api/quote', json={'book_ids': [river.id], 'durations': [0]}).status_code == 400
+    assert test_client.post('/api/quote', json={'book_ids': 'all'}).status_code == 400
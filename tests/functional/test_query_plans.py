@@ -0,0 +1,75 @@
+import re
+from datetime import datetime
+
+import pytest
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+from app import db
+from app.models import Book, CustomPricing, Rental
+from app.statements import month_rentals
+
+
+class Explain(Executable, ClauseElement):
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(Explain)
+def compile_explain(element, compiler, **kw):
+    prefix = 'EXPLAIN QUERY PLAN ' if compiler.dialect.name == 'sqlite' else 'EXPLAIN '
+    return prefix + compiler.process(element.statement, **kw)
+
+
+def query_plan(query):
+    if db.engine.dialect.name == 'postgresql':
+        # the tables are tiny here, so make the planner show whether an index is usable at all
+        db.session.execute('SET LOCAL enable_seqscan = off')
+        return [row[0] for row in db.session.execute(Explain(query.statement))]
+    return [row[-1] for row in db.session.execute(Explain(query.statement))]
+
+
+def full_scans(plan, table):
+    if db.engine.dialect.name == 'postgresql':
+        pattern = re.compile(rf'Seq Scan on {table}\b')
+    else:
+        # SQLite before 3.36 prints 'SCAN TABLE rental', later versions 'SCAN rental'
+        pattern = re.compile(rf'^SCAN (TABLE )?{table}\b')
+    return [line for line in plan if pattern.search(line.strip())]
+
+
+QUERIES = {
+    'customer history': (lambda: Rental.query.filter(Rental.customer_id == 1).order_by(Rental.created_at.desc()),
+                         'rental'),
+    'rentals of a book': (lambda: Rental.query.filter(Rental.book_id == 1), 'rental'),
+    'ledger page': (lambda: Rental.ledger().filter(Rental.id > 10).limit(50), 'rental'),
+    'ledger date range': (lambda: month_rentals(datetime(2021, 3, 1), datetime(2021, 4, 1)), 'rental'),
+    'overdue sweep': (lambda: Rental.query.filter(Rental.returned_at.is_(None), Rental.due_at < datetime(2021, 3, 1))
+                      .order_by(Rental.due_at, Rental.id).limit(1000), 'rental'),
+    'books by author': (lambda: Book.query.filter(Book.author == 1), 'book'),
+    'books by type': (lambda: Book.query.filter(Book.book_type == 1), 'book'),
+    'custom pricing by type': (lambda: CustomPricing.query.filter(CustomPricing.book_type == 1), 'custom_pricing'),
+}
+
+
+@pytest.mark.parametrize('name', sorted(QUERIES))
+def test_hot_queries_use_indexes(test_client, init_database, name):
+    """
+    the hot query paths never fall back to a full table scan
+    """
+    build, table = QUERIES[name]
+    plan = query_plan(build())
+    assert not full_scans(plan, table), '\n'.join(plan)
+    db.session.rollback()
+
+
+def test_full_scans_are_detected(test_client, init_database):
+    """
+    a query no index can serve is reported, so the checks above cannot pass on a plan format
+    full_scans() does not understand
+    """
+    plan = query_plan(Rental.query.filter(Rental.duration == 3))
+    assert full_scans(plan, 'rental'), '\n'.join(plan)
+    db.session.rollback()
@@ -0,0 +1,77 @@
+from decimal import Decimal
+
+from app import db
+from app.models import Book, Customer, Rental
+from app.pricing import pricing
+
+
+def test_rent_book_stores_cost(test_client, init_database, login_default_user):
+    """
+    renting stores the rate and total, and later price edits leave it alone
+    """
+    customer = Customer.query.filter_by(email='jane.doe@gmail.com').first()
+    book = Book.query.filter_by(title='The Man in the Mask').first()
+    response = test_client.post('/rent/book', data=dict(customer=customer.id, book=[book.id], duration=3))
+    assert response.status_code == 302
+
+    rental = Rental.query.filter_by(customer_id=customer.id, book_id=book.id).order_by(Rental.id.desc()).first()
+    assert rental.unit_price == Decimal('3.00')
+    assert rental.total_cost == Decimal('9.00')
+
+    book.type.rent_charge = 10
+    db.session.commit()
+    pricing.invalidate()
+    assert rental.get_cost() == Decimal('9.00')
+
+    book.type.rent_charge = 3
+    db.session.commit()
+    pricing.invalidate()
+
+
+def test_bulk_rental_api(test_client, init_database, login_default_user):
+    """
+    the JSON endpoint inserts every rental in one transaction
+    """
+    customers = [c.id for c in Customer.query.all()]
+    books = [b.id for b in Book.query.all()]
+    before = Rental.query.count()
+    payload = {'rentals': [{'customer_id': c, 'book_ids': books, 'duration': 2} for c in customers]}
+    response = test_client.post('/api/rentals', json=payload)
+    assert response.status_code == 201
+    assert response.get_json() == {'created': len(customers) * len(books)}
+    assert Rental.query.count() == before + len(customers) * len(books)
+    assert Rental.query.filter(Rental.total_cost.is_(None)).count() == 0
+
+
+def test_bulk_rental_api_rejects_unknown_rows(test_client, init_database, login_default_user):
+    """
+    one bad entry rejects the whole batch
+    """
+    book = Book.query.first()
+    before = Rental.query.count()
+    payload = {'rentals': [{'customer_id': 999, 'book_ids': [book.id], 'duration': 2},
+                           {'customer_id': Customer.query.first().id, 'book_ids': [book.id], 'duration': 2}]}
+    response = test_client.post('/api/rentals', json=payload)
+    assert response.status_code == 400
+    assert response.get_json()['errors'][0]['index'] == 0
+    assert Rental.query.count() == before
+
+
+def test_rentals_price_from_current_rates(test_client, init_database, login_default_user):
+    """
+    a rate edited by another worker, which never invalidated this one's pricing table, is what the next rental stores
+    """
+    customer = Customer.query.first()
+    book = Book.query.filter_by(title='The Man in the Mask').first()
+    pricing.rules
+    book_types = book.type.__table__
+    db.session.execute(book_types.update().where(book_types.c.id == book.book_type).values(rent_charge=4))
+    db.session.commit()
+
+    test_client.post('/rent/book', data=dict(customer=customer.id, book=[book.id], duration=3))
+    rental = Rental.query.order_by(Rental.id.desc()).first()
+    assert (rental.unit_price, rental.total_cost) == (Decimal('4.00'), Decimal('12.00'))
+
+    db.session.execute(book_types.update().where(book_types.c.id == book.book_type).values(rent_charge=3))
+    db.session.commit()
+    pricing.invalidate()
@@ -0,0 +1,33 @@
+import pytest
+
+from flask import current_app
+
+from app import db
+from app.models import Customer
+
+
+@pytest.fixture(scope='function')
+def replica(monkeypatch):
+    monkeypatch.setitem(current_app.config, 'SQLALCHEMY_BINDS', {'replica': 'sqlite://'})
+    engine = db.get_engine(current_app, bind='replica')
+    db.Model.metadata.create_all(engine)
+    yield engine
+    db.session.remove()
+    current_app.extensions['sqlalchemy'].connectors.pop('replica', None)
+    engine.dispose()
+
+
+def test_read_only_views_use_replica(test_client, init_database, login_default_user, replica):
+    """
+    list pages read from the replica while writes still go to the primary
+    """
+    replica.execute(Customer.__table__.insert(),
+                    {'first_name': 'Only', 'last_name': 'Replica', 'email': 'replica@example.com'})
+    response = test_client.get('/customers')
+    assert b'replica@example.com' in response.data
+    assert b'jane.doe@gmail.com' not in response.data
+
+    test_client.post('/add/customer', data=dict(first_name='On', last_name='Primary', email='primary@example.com'))
+    db.session.remove()
+    assert Customer.query.filter_by(email='primary@example.com').count() == 1
+    assert replica.execute("select count(*) from customer where email = 'primary@example.com'").scalar() == 0
@@ -0,0 +1,107 @@
+import re
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import event
+
+from app import db
+from app.models import Book, Customer, Rental, RentalRollup
+from app.reports import rebuild, report
+
+
+def test_rollups_follow_new_rentals(test_client, init_database, login_default_user):
+    """
+    rentals written through the API and the session both land in the rollups, and the
+    totals match a rebuild from the rental table
+    """
+    customer = Customer.query.first()
+    books = Book.query.all()
+    response = test_client.post('/api/rentals', json={'rentals': [
+        {'customer_id': customer.id, 'book_ids': [b.id for b in books], 'duration': 3},
+        {'customer_id': customer.id, 'book_ids': [books[0].id], 'duration': 2},
+    ]})
+    assert response.status_code == 201
+    db.session.add(Rental(customer=customer, book=books[1], duration=4, created_at=datetime(2020, 5, 1)))
+    db.session.commit()
+
+    response = test_client.get('/api/reports?by=book_type&by=customer')
+    assert response.status_code == 200
+    rows = response.get_json()['rows']
+    assert sum(r['rentals'] for r in rows) == Rental.query.count()
+    assert {r['book_type']['name'] for r in rows} == {b.get_book_type() for b in books}
+    assert rows[0]['customer']['name'] == f'{customer.first_name} {customer.last_name}'
+
+    incremental = report(by=['day', 'book_type', 'author', 'customer'])
+    rebuild()
+    assert report(by=['day', 'book_type', 'author', 'customer']) == incremental
+
+
+def test_reports_read_only_the_rollups(test_client, init_database, login_default_user):
+    """
+    the report page filters by day and never reads the rental table
+    """
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        response = test_client.get('/reports?from=2020-05-01&to=2020-05-01&by=author')
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    assert response.status_code == 200
+    assert b'Kenny Gee' in response.data
+    assert b'Pat Dee' not in response.data
+    assert [s for s in statements if 'rental_rollup' in s]
+    assert not [s for s in statements if re.search(r'\brental\b', s)]
+
+
+def test_reports_page_through_every_group(test_client, init_database, login_default_user):
+    """
+    a report larger than one page hands out a cursor, and following it visits every group once
+    in the same order as one large page
+    """
+    # two groups with the same revenue, ordered by their keys
+    book = Book.query.first()
+    db.session.add_all([Rental(customer=c, book=book, duration=2, created_at=datetime(2021, 1, 1))
+                        for c in Customer.query.all()])
+    db.session.commit()
+    everything = test_client.get('/api/reports?by=book_type,customer,day').get_json()
+    assert everything['next'] is None
+    rows, url = [], '/api/reports?by=book_type,customer,day&per_page=1'
+    while url:
+        page = test_client.get(url).get_json()
+        assert len(page['rows']) == 1
+        rows += page['rows']
+        url = page['next'] and f'/api/reports?by=book_type,customer,day&per_page=1&after={page["next"]}'
+    assert len(rows) > 1
+    assert len({r['revenue'] for r in rows}) < len(rows)
+    assert rows == everything['rows']
+
+    response = test_client.get('/reports?by=book_type&per_page=1')
+    assert b'Next &rarr;' in response.data
+
+
+def test_report_rejects_unknown_dimensions(test_client, init_database, login_default_user):
+    assert test_client.get('/api/reports?by=title').status_code == 400
+    assert test_client.get('/api/reports?from=yesterday').status_code == 400
+    assert test_client.get('/api/reports?by=day&after=1.50,3').status_code == 400
+
+
+def test_rebuild_rollups_command(test_client, init_database):
+    """
+    flask rebuild-rollups backfills a day range from the rentals
+    """
+    expected = report(by=['day'])
+    RentalRollup.query.delete()
+    db.session.commit()
+
+    result = current_app.test_cli_runner().invoke(args=['rebuild-rollups', '--from', '2020-05-01', '--to', '2020-05-01'])
+    assert result.exit_code == 0
+    assert 'Rolled up 1 rentals' in result.output
+    rows, _ = report(by=['day'])
+    assert [r['day'] for r in rows] == ['2020-05-01']
+
+    current_app.test_cli_runner().invoke(args=['rebuild-rollups'])
+    assert report(by=['day']) == expected
@@ -0,0 +1,101 @@
+from app import db
+from app.models import Author, Book, BookType, Customer, Rental
+from tests.functional.test_ledger import count_queries
+
+
+def test_customer_prefix_search(test_client, init_database, login_default_user):
+    """
+    customers are matched on a case-insensitive prefix of their name or email
+    """
+    response = test_client.get('/api/customers/search?q=ja')
+    assert response.status_code == 200
+    assert [r['text'] for r in response.get_json()['results']] == ['Jane Doe']
+
+    response = test_client.get('/api/customers/search?q=%25')
+    assert response.get_json()['results'] == []
+
+
+def test_book_search_includes_price(test_client, init_database, login_default_user):
+    """
+    book results carry the rent charge shown on the rental form
+    """
+    response = test_client.get('/api/books/search?q=the river')
+    results = response.get_json()['results']
+    assert len(results) == 1
+    assert results[0]['text'].startswith('The River Between @ $')
+
+
+def test_rent_book_form_constant_queries(test_client, init_database, login_default_user):
+    """
+    the rental form does not load the customer or book catalog
+    """
+    def get_form():
+        db.session.expire_all()
+        assert test_client.get('/rent/book').status_code == 200
+
+    get_form()
+    before = count_queries(get_form)
+    author = Author.query.first()
+    book_type = BookType.query.first()
+    db.session.add_all([Customer(first_name='Form', last_name=str(i), email=f'form{i}@example.com')
+                        for i in range(30)])
+    db.session.add_all([Book(title=f'Form {i}', book_type=book_type.id, author=author.id) for i in range(30)])
+    db.session.commit()
+    assert count_queries(get_form) == before
+
+
+def test_book_type_edit_invalidates_reference_cache(test_client, init_database, login_default_user):
+    """
+    renaming a book type through the route is visible on the next lookup
+    """
+    book = Book.query.filter_by(title='The River Between').first()
+    assert book.get_book_type() == 'Regular'
+    response = test_client.post(f'/edit/book/type/{book.book_type}',
+                                data=dict(name='Classic', rent_charge='1.5', custom_pricing='0'))
+    assert response.status_code == 302
+    assert book.get_book_type() == 'Classic'
+    stats = test_client.get('/api/cache/stats').get_json()
+    assert stats['book_types']['misses'] >= 1
+
+    test_client.post(f'/edit/book/type/{book.book_type}',
+                     data=dict(name='Regular', rent_charge='1.5', custom_pricing='0'))
+
+
+def test_typeahead_fields_reject_missing_and_unknown_ids(test_client, init_database, login_default_user):
+    """
+    forms submitted without picking from a typeahead, or with an id that does not exist, are re-shown with an error
+    """
+    customer = Customer.query.first()
+    book = Book.query.first()
+    books, rentals = Book.query.count(), Rental.query.count()
+
+    for data in (dict(book=[book.id], duration=3), dict(customer=9999, book=[book.id], duration=3),
+                 dict(customer=customer.id, duration=3), dict(customer=customer.id, book=[9999], duration=3)):
+        response = test_client.post('/rent/book', data=data)
+        assert response.status_code == 200
+        assert b'help-block' in response.data
+
+    for data in (dict(title='No Author', book_type=book.book_type),
+                 dict(title='No Author', book_type=book.book_type, author=9999)):
+        assert test_client.post('/add/book', data=data).status_code == 200
+        assert test_client.post(f'/edit/book/{book.id}', data=data).status_code == 200
+
+    assert (Book.query.count(), Rental.query.count()) == (books, rentals)
+    assert Book.query.get(book.id).author is not None
+    assert test_client.get('/books').status_code == 200
+
+
+def test_edit_book_reads_author_choices_once(test_client, init_database, login_default_user):
+    """
+    a rejected edit re-shows the submitted author with no more queries than showing the form
+    """
+    book = Book.query.first()
+    author = Author.query.get(book.author)
+    responses = []
+    data = dict(title='', book_type=book.book_type, author=author.id)
+    test_client.get(f'/edit/book/{book.id}')
+    shown = count_queries(lambda: responses.append(test_client.get(f'/edit/book/{book.id}')))
+    rejected = count_queries(lambda: responses.append(test_client.post(f'/edit/book/{book.id}', data=data)))
+    assert rejected == shown
+    assert all(f'{author.first_name} {author.last_name}'.encode() in r.data for r in responses)
+    assert b'help-block' in responses[1].data
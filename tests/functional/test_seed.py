@@ -0,0 +1,16 @@
+from flask import current_app
+
+from app.models import Book, Customer, Rental
+
+
+def test_seed_command(test_client, init_database):
+    """
+    flask seed adds customers, books and priced rentals
+    """
+    customers, books, rentals = Customer.query.count(), Book.query.count(), Rental.query.count()
+    result = current_app.test_cli_runner().invoke(args=['seed', '--scale', '20'])
+    assert result.exit_code == 0, result.output
+    assert Customer.query.count() == customers + 20
+    assert Book.query.count() == books + 10
+    assert Rental.query.count() == rentals + 100
+    assert Rental.query.filter(Rental.total_cost.is_(None), Rental.id > rentals).count() == 0
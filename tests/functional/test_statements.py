@@ -0,0 +1,82 @@
+import io
+import os
+import zipfile
+from datetime import datetime
+
+from flask import current_app
+
+from app import db
+from app.models import Book, Customer, Rental
+
+
+def test_print_statement_is_cached(test_client, init_database, login_default_user, tmp_path, monkeypatch):
+    """
+    the second download of an unchanged statement is served from the PDF cache
+    """
+    monkeypatch.setitem(current_app.config, 'PDF_CACHE_DIR', str(tmp_path))
+    rental = Rental(customer=Customer.query.first(), book=Book.query.first(), duration=2)
+    db.session.add(rental)
+    db.session.commit()
+
+    view = test_client.get(f'/view/statement/{rental.id}')
+    assert view.status_code == 200
+    assert f'/print/statement/{rental.id}'.encode() in view.data
+
+    first = test_client.get(f'/print/statement/{rental.id}')
+    assert first.status_code == 200
+    assert first.mimetype == 'application/pdf'
+    [cached] = os.listdir(tmp_path)
+    mtime = os.stat(tmp_path / cached).st_mtime_ns
+
+    second = test_client.get(f'/print/statement/{rental.id}')
+    assert second.data == first.data
+    assert os.listdir(tmp_path) == [cached]
+    assert os.stat(tmp_path / cached).st_mtime_ns == mtime
+
+    rental.duration = 3
+    db.session.commit()
+    test_client.get(f'/print/statement/{rental.id}')
+    assert len(os.listdir(tmp_path)) == 2
+
+    # the statement also shows the author and book type names
+    rental.book.writer.last_name = 'Dee-Renamed'
+    db.session.commit()
+    test_client.get(f'/print/statement/{rental.id}')
+    assert len(os.listdir(tmp_path)) == 3
+    rental.book.type.name = rental.book.type.name + ' '
+    db.session.commit()
+    test_client.get(f'/print/statement/{rental.id}')
+    assert len(os.listdir(tmp_path)) == 4
+    rental.book.writer.last_name = 'Dee'
+    rental.book.type.name = rental.book.type.name.strip()
+    db.session.commit()
+
+
+def test_monthly_statement_archive(test_client, init_database, login_default_user):
+    """
+    the monthly export holds one statement per customer with rentals that month
+    """
+    customers = Customer.query.all()
+    book = Book.query.first()
+    when = datetime(2021, 3, 15)
+    db.session.add_all([Rental(customer=c, book=book, duration=d, created_at=when)
+                        for c in customers for d in (1, 2)])
+    db.session.commit()
+
+    response = test_client.get('/statements/2021-03.zip')
+    assert response.status_code == 200
+    archive = zipfile.ZipFile(io.BytesIO(response.data))
+    assert len(archive.namelist()) == len(customers)
+    assert all(name.startswith('2021-03/') for name in archive.namelist())
+
+    assert test_client.get('/statements/2021-13.zip').status_code == 404
+
+
+def test_statements_command(test_client, init_database, tmp_path):
+    """
+    the CLI writes the same archive to a file
+    """
+    output = tmp_path / 'out.zip'
+    result = current_app.test_cli_runner().invoke(args=['statements', '2021-03', '-o', str(output)])
+    assert result.exit_code == 0, result.output
+    assert len(zipfile.ZipFile(output).namelist()) == Customer.query.count()
@@ -0,0 +1,33 @@
+import os
+import subprocess
+import sys
+
+from app import create_app
+from app.config import Config
+
+
+class OtherConfig(Config):
+    TESTING = True
+    PER_PAGE = 7
+
+
+def test_create_app_builds_independent_apps():
+    """
+    test every call returns a separately configured app with the routes registered
+    """
+    first, second = create_app(OtherConfig), create_app()
+    assert first is not second
+    assert first.config['PER_PAGE'] == 7
+    assert second.config['PER_PAGE'] == Config.PER_PAGE
+    assert 'main.index' in first.view_functions
+    assert 'seed' in first.cli.commands
+
+
+def test_pdf_stack_is_not_imported_at_startup():
+    """
+    test building the app leaves WeasyPrint unimported until a PDF is rendered
+    """
+    code = 'import sys; from app import create_app; create_app(); print("weasyprint" in sys.modules)'
+    root = os.path.join(os.path.dirname(__file__), '..', '..')
+    output = subprocess.run([sys.executable, '-c', code], cwd=root, check=True, stdout=subprocess.PIPE).stdout
+    assert output.strip() == b'False'
@@ -0,0 +1,54 @@
+from app.cache import TTLCache
+
+
+def test_cache_counts_hits_and_misses():
+    """
+    test repeated lookups are served from the cache
+    """
+    loads = []
+    cache = TTLCache(maxsize=10, ttl=60)
+
+    def load(key):
+        loads.append(key)
+        return key * 2
+
+    assert cache.get(1, load) == 2
+    assert cache.get(1, load) == 2
+    assert loads == [1]
+    assert cache.stats() == {'hits': 1, 'misses': 1, 'size': 1, 'maxsize': 10}
+
+    cache.invalidate(1)
+    assert cache.get(1, load) == 2
+    assert loads == [1, 1]
+
+
+def test_cache_is_bounded():
+    """
+    test the least recently used entry is evicted
+    """
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.get(1, str)
+    cache.get(2, str)
+    cache.get(1, str)
+    cache.get(3, str)
+    assert cache.stats()['size'] == 2
+    assert cache.get(1, lambda key: 'reloaded') == '1'
+    assert cache.get(2, lambda key: 'reloaded') == 'reloaded'
+
+
+def test_cache_entries_expire():
+    """
+    test entries are reloaded once the ttl has passed
+    """
+    cache = TTLCache(maxsize=2, ttl=0)
+    cache.get(1, str)
+    assert cache.get(1, lambda key: 'reloaded') == 'reloaded'
+
+
+def test_missing_rows_are_not_cached():
+    """
+    test a lookup that finds nothing is retried next time
+    """
+    cache = TTLCache(maxsize=2, ttl=60)
+    assert cache.get(1, lambda key: None) is None
+    assert cache.get(1, str) == '1'
@@ -0,0 +1,49 @@
+import os
+import runpy
+
+from app.config import engine_options
+
+
+def test_sqlite_keeps_default_pool():
+    """
+    test sqlite urls get no pool options
+    """
+    assert engine_options('sqlite://') == {}
+
+
+def test_postgres_pool_options(monkeypatch):
+    """
+    test pool and statement timeout settings come from the environment
+    """
+    monkeypatch.setenv('DB_POOL_SIZE', '20')
+    monkeypatch.setenv('DB_STATEMENT_TIMEOUT', '5000')
+    options = engine_options('postgresql://bookstore@localhost/bookstore')
+    assert options['pool_size'] == 20
+    assert options['pool_pre_ping'] is True
+    assert options['connect_args'] == {'options': '-c statement_timeout=5000'}
+
+
+def serving_profile(monkeypatch, tmp_path, **env):
+    # set here so the setdefault in gunicorn.conf.py does not leak into later tests
+    monkeypatch.setenv('PROMETHEUS_MULTIPROC_DIR', str(tmp_path))
+    for name in ('WEB_WORKER_CLASS', 'WEB_CONCURRENCY', 'WEB_THREADS', 'WEB_PRELOAD'):
+        monkeypatch.delenv(name, raising=False)
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    path = os.path.join(os.path.dirname(__file__), '..', '..', 'gunicorn.conf.py')
+    return runpy.run_path(path)
+
+
+def test_serving_profiles(monkeypatch, tmp_path):
+    """
+    test worker class, workers, threads and preloading come from the environment
+    """
+    profile = serving_profile(monkeypatch, tmp_path, WEB_WORKER_CLASS='gthread', WEB_CONCURRENCY='3',
+                              WEB_THREADS='16')
+    assert (profile['worker_class'], profile['workers'], profile['threads']) == ('gthread', 3, 16)
+    assert profile['preload_app'] is True
+    # threads > 1 would make gunicorn run a "sync" profile as gthread
+    assert serving_profile(monkeypatch, tmp_path, WEB_THREADS='16')['threads'] == 1
+    gevent = serving_profile(monkeypatch, tmp_path, WEB_WORKER_CLASS='gevent')
+    assert (gevent['worker_class'], gevent['preload_app']) == ('gevent', False)
+    assert serving_profile(monkeypatch, tmp_path, WEB_PRELOAD='0')['preload_app'] is False
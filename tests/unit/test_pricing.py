@@ -0,0 +1,33 @@
+from decimal import Decimal
+
+from app.pricing import Rule, evaluate, flat_rule, custom_rule, legacy_rule
+
+
+def test_flat_rule():
+    """
+    test flat per day pricing
+    """
+    rule = flat_rule(Decimal('3.0'))
+    assert evaluate(rule, 1) == Decimal('3.00')
+    assert evaluate(rule, 4) == Decimal('12.00')
+
+
+def test_custom_rule():
+    """
+    test the minimum charge covers the first days
+    """
+    rule = custom_rule(Decimal('1.5'), Decimal('4.5'), 3)
+    assert evaluate(rule, 1) == Decimal('4.50')
+    assert evaluate(rule, 3) == Decimal('4.50')
+    assert evaluate(rule, 5) == Decimal('7.50')
+
+
+def test_legacy_rules():
+    """
+    test the Regular and Novel rules match what Rental.get_cost used to return
+    """
+    regular = legacy_rule('Regular', Decimal('1.5'))
+    assert [evaluate(regular, d) for d in (1, 2, 3, 5)] == [2, 4, Decimal('3.5'), Decimal('6.5')]
+    novel = legacy_rule('Novel', Decimal('1.5'))
+    assert [evaluate(novel, d) for d in (1, 2, 3, 4)] == [Decimal('4.5'), Decimal('4.5'), Decimal('4.5'), 6]
+    assert isinstance(regular, Rule)